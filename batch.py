@@ -0,0 +1,207 @@
+import argparse
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import random
+import sys
+import time
+
+from bitbase import DIRECTORY, Bitbases
+from board import START_FEN, move_name
+from book import OpeningBook
+from engine import Engine
+from game_state import BACKENDS
+from movegen import legal_moves
+from pgn import export_pgn, result, san
+from transposition import TranspositionTable
+
+# The pool's worker processes each build one of these in the initializer.
+_worker = None
+
+
+class BatchWorker:
+    def __init__(self, options):
+        self.options = options
+        self.table = TranspositionTable(options["table_mb"])
+        self.book = OpeningBook(options["book"], options["book_best"]) if options["book"] else None
+        self.bitbases = Bitbases(options["bitbases"])
+        # Every process streams its own files, so no output is shared or locked.
+        prefix = os.path.join(options["out"], f"{options['mode']}-{os.getpid()}")
+        self.jsonl = open(prefix + ".jsonl", "a")
+        self.pgn = open(prefix + ".pgn", "a") if options["mode"] == "selfplay" else None
+
+    def new_engine(self, book=None):
+        # Fresh search state per game or position keeps results independent
+        # of which worker ran them and in what order.
+        self.table.clear()
+        return Engine(self.options["time"], self.options["depth"], table=self.table, book=book,
+                      bitbases=self.bitbases)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.jsonl.close()
+        if self.pgn:
+            self.pgn.close()
+        if self.book:
+            self.book.close()
+        self.bitbases.close()
+
+    def write(self, record, pgn=None):
+        self.jsonl.write(json.dumps(record) + "\n")
+        self.jsonl.flush()
+        if pgn:
+            self.pgn.write(pgn + "\n")
+            self.pgn.flush()
+
+    def play(self, index):
+        options = self.options
+        seed = options["seed"] + index
+        rng = random.Random(seed)
+        board = BACKENDS[options["backend"]]()
+        board.set_fen(options["fen"])
+        if self.book:
+            self.book.random.seed(seed)
+        engine = self.new_engine(self.book)
+        start, nodes = time.perf_counter(), 0
+
+        # A few seeded random opening moves so games differ from each other.
+        for _ in range(options["random_plies"]):
+            moves = legal_moves(board)
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        game_result = result(board)
+        while game_result == "*" and board.ply < options["max_plies"]:
+            board.make_move(engine.search(board))
+            nodes += engine.nodes
+            game_result = result(board)
+        if game_result == "*":
+            game_result = "1/2-1/2"
+
+        record = {
+            "game": index, "seed": seed, "result": game_result, "plies": board.ply, "nodes": nodes,
+            "seconds": round(time.perf_counter() - start, 3), "fen": board.fen(),
+        }
+        pgn = export_pgn(board, {
+            "Event": "Self-play", "Round": str(index + 1), "White": "Engine", "Black": "Engine", "Seed": str(seed),
+        }, game_result)
+        self.write(record, pgn)
+        return record
+
+    def analyze(self, item):
+        index, fen = item
+        board = BACKENDS[self.options["backend"]]()
+        board.set_fen(fen)
+        engine = self.new_engine()
+        start = time.perf_counter()
+        move = engine.search(board)
+        record = {
+            "index": index, "fen": fen, "bestmove": move_name(move) if move else None,
+            "san": san(board, move) if move else None, "score": engine.score, "depth": engine.depth,
+            "nodes": engine.nodes, "pv": " ".join(map(move_name, engine.pv)),
+            "hashfull": int(self.table.usage() * 1000),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        self.write(record)
+        return record
+
+
+def _init_worker(options):
+    global _worker
+    _worker = BatchWorker(options)
+    # Runs when a pool process exits normally, so its files are closed.
+    multiprocessing.util.Finalize(_worker, _worker.close, exitpriority=10)
+
+
+def _play(index):
+    return _worker.play(index)
+
+
+def _analyze(item):
+    return _worker.analyze(item)
+
+
+def read_positions(path):
+    # One FEN per line; EPD lines keep only their four position fields.
+    with open(path) as f:
+        for line in f:
+            fields = line.split("#")[0].split()
+            if len(fields) >= 4:
+                yield " ".join(fields[:6] if fields[4:6] and all(f.isdigit() for f in fields[4:6]) else fields[:4])
+
+
+def run(options, workers):
+    if options["mode"] == "selfplay":
+        task, items = _play, range(options["games"])
+    else:
+        task, items = _analyze, enumerate(read_positions(options["positions"]))
+    os.makedirs(options["out"], exist_ok=True)
+    if workers == 1:
+        with BatchWorker(options) as worker:
+            yield from map(worker.play if task is _play else worker.analyze, items)
+        return
+    with multiprocessing.Pool(workers, _init_worker, (options,)) as pool:
+        yield from pool.imap_unordered(task, items)
+        # Let the workers exit on their own so their finalizers run; leaving
+        # the block would terminate them.
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine games or analyse positions across worker processes.")
+    parser.add_argument("mode", choices=("selfplay", "analyze"))
+    parser.add_argument("positions", nargs="?", help="FEN/EPD file to analyse (analyze mode)")
+    parser.add_argument("--games", type=int, default=10, help="number of self-play games")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0, help="game i uses seed + i")
+    parser.add_argument("--time", type=float, help="seconds per move (default 0.1, unlimited with --depth)")
+    parser.add_argument("--depth", type=int, help="fixed search depth; with no --time, results are reproducible")
+    parser.add_argument("--random-plies", type=int, default=4, help="seeded random moves before the engine plays")
+    parser.add_argument("--max-plies", type=int, default=400, help="adjudicate a draw after this many plies")
+    parser.add_argument("--fen", default=START_FEN, help="self-play start position")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="array")
+    parser.add_argument("--book", help="Polyglot .bin opening book for self-play")
+    parser.add_argument("--book-best", action="store_true", help="always play the highest-weight book move")
+    parser.add_argument("--bitbases", default=DIRECTORY, help="directory of generated endgame bitbases")
+    parser.add_argument("--table-mb", type=float, default=16, help="transposition table size per worker")
+    parser.add_argument("--out", default="batch-results", help="directory for the per-worker JSONL/PGN files")
+    args = parser.parse_args(argv)
+    if args.mode == "analyze" and not args.positions:
+        parser.error("analyze needs a positions file")
+
+    options = {
+        "mode": args.mode, "games": args.games, "positions": args.positions, "seed": args.seed,
+        "time": args.time if args.time is not None else float("inf") if args.depth else 0.1,
+        "depth": args.depth or 64, "random_plies": args.random_plies, "max_plies": args.max_plies,
+        "fen": args.fen, "backend": args.backend, "table_mb": args.table_mb, "out": args.out,
+        "book": args.book, "book_best": args.book_best, "bitbases": args.bitbases,
+    }
+    start = time.perf_counter()
+    results, nodes, count = {}, 0, 0
+    for record in run(options, max(args.workers, 1)):
+        count += 1
+        nodes += record["nodes"]
+        if args.mode == "selfplay":
+            results[record["result"]] = results.get(record["result"], 0) + 1
+            print(f"game {record['game']:>4}  {record['result']:<7}  {record['plies']:>3} plies  "
+                  f"{record['seconds']:7.2f}s")
+        else:
+            print(f"{record['index']:>5}  {record['san'] or '-':<8} {record['score']:>6}  depth {record['depth']}  "
+                  f"{record['fen']}")
+    elapsed = time.perf_counter() - start
+    summary = [f"{count} {'games' if args.mode == 'selfplay' else 'positions'}"]
+    summary += [f"{key} {value}" for key, value in sorted(results.items())]
+    summary += [f"Time: {elapsed:.2f}s", f"NPS: {int(nodes / elapsed) if elapsed else 0}"]
+    print("\n" + "  ".join(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
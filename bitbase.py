@@ -0,0 +1,190 @@
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from board import BLACK, DIAGONAL_RAYS, KING, KING_TARGETS, LINEAR_RAYS, PAWN, PAWN_ATTACKS, QUEEN, ROOK, WHITE
+
+DIRECTORY = os.path.join("res", "bitbases")
+ENDINGS = {QUEEN: "kqk", ROOK: "krk", PAWN: "kpk"}
+# Positions are indexed by strong king, strong piece and lone king square,
+# with the strong side always white (black positions are mirrored). A file
+# holds one bit per index with white to move (set: white wins) followed by
+# one bit per index with black to move (set: black loses).
+SIZE = 1 << 18
+KING_MASKS = tuple(sum(1 << t for t in KING_TARGETS[sq]) for sq in range(64))
+
+
+def _attacks(kind, sq, blocker):
+    # Squares a white piece attacks when the only other piece in the way is
+    # the white king on blocker; the lone king never blocks its own escape.
+    if kind == PAWN:
+        return sum(1 << t for t in PAWN_ATTACKS[WHITE][sq])
+    rays = LINEAR_RAYS[sq] + (DIAGONAL_RAYS[sq] if kind == QUEEN else ())
+    mask = 0
+    for ray in rays:
+        for t in ray:
+            mask |= 1 << t
+            if t == blocker:
+                break
+    return mask
+
+
+def _piece_squares(kind):
+    return range(8, 56) if kind == PAWN else range(64)
+
+
+def _unmoves(kind, sq, wk, bk):
+    # Squares the piece could have come from to reach sq with a quiet move.
+    if kind == PAWN:
+        if sq >= 16 and sq - 8 not in (wk, bk):
+            yield sq - 8
+            if 24 <= sq < 32 and sq - 16 not in (wk, bk):
+                yield sq - 16
+        return
+    rays = LINEAR_RAYS[sq] + (DIAGONAL_RAYS[sq] if kind == QUEEN else ())
+    for ray in rays:
+        for t in ray:
+            if t == wk or t == bk:
+                break
+            yield t
+
+
+def generate(kind, promotions=None):
+    # Retrograde analysis: start from the checkmates (and, for pawn endings,
+    # promotions into won queen or rook endings), then walk moves backwards.
+    # A white-to-move position is won once one move reaches a lost black
+    # position; a black position is lost once every black move reaches a won
+    # white one, tracked with a per-position count of moves not yet refuted.
+    attacks = [[_attacks(kind, p, wk) for p in range(64)] for wk in range(64)]
+    win, lost, count = bytearray(SIZE), bytearray(SIZE), bytearray(SIZE)
+    lost_queue, win_queue = [], []
+
+    for wk in range(64):
+        for p in _piece_squares(kind):
+            if p == wk:
+                continue
+            attacked = attacks[wk][p]
+            for bk in range(64):
+                if bk == wk or bk == p or KING_MASKS[wk] >> bk & 1:
+                    continue
+                index = wk << 12 | p << 6 | bk
+                escapes = 0
+                for t in KING_TARGETS[bk]:
+                    if t != wk and not KING_MASKS[wk] >> t & 1 and (t == p or not attacked >> t & 1):
+                        escapes += 1
+                count[index] = escapes
+                if not escapes and attacked >> bk & 1:
+                    lost[index] = 1
+                    lost_queue.append(index)
+                if promotions and 48 <= p < 56 and p + 8 not in (wk, bk) and not attacked >> bk & 1:
+                    promoted = wk << 12 | p + 8 << 6 | bk
+                    if any(table[promoted] for table in promotions):
+                        win[index] = 1
+                        win_queue.append(index)
+
+    while lost_queue or win_queue:
+        while lost_queue:
+            index = lost_queue.pop()
+            wk, p, bk = index >> 12, index >> 6 & 63, index & 63
+            # White's last move was the king or the piece.
+            for origin in KING_TARGETS[wk]:
+                if origin != p and origin != bk and not KING_MASKS[bk] >> origin & 1 \
+                        and not attacks[origin][p] >> bk & 1:
+                    _mark_win(origin << 12 | p << 6 | bk, win, win_queue)
+            for origin in _unmoves(kind, p, wk, bk):
+                if not attacks[wk][origin] >> bk & 1:
+                    _mark_win(wk << 12 | origin << 6 | bk, win, win_queue)
+        while win_queue:
+            index = win_queue.pop()
+            wk, p, bk = index >> 12, index >> 6 & 63, index & 63
+            for origin in KING_TARGETS[bk]:
+                if origin != wk and origin != p and not KING_MASKS[wk] >> origin & 1:
+                    previous = wk << 12 | p << 6 | origin
+                    if not lost[previous]:
+                        count[previous] -= 1
+                        if not count[previous]:
+                            lost[previous] = 1
+                            lost_queue.append(previous)
+    return win, lost
+
+
+def _mark_win(index, win, queue):
+    if not win[index]:
+        win[index] = 1
+        queue.append(index)
+
+
+def _pack(flags):
+    bits = bytearray(len(flags) // 8)
+    for index in range(0, len(flags)):
+        if flags[index]:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+
+def generate_all(directory=DIRECTORY):
+    os.makedirs(directory, exist_ok=True)
+    lost_tables = {}
+    for kind, name in ENDINGS.items():
+        start = time.perf_counter()
+        promotions = [lost_tables[QUEEN], lost_tables[ROOK]] if kind == PAWN else None
+        win, lost = generate(kind, promotions)
+        lost_tables[kind] = lost
+        with open(os.path.join(directory, name + ".bin"), "wb") as f:
+            f.write(_pack(win) + _pack(lost))
+        print(f"{name}: {sum(win)} white wins, {sum(lost)} black losses  {time.perf_counter() - start:.1f}s")
+
+
+class Bitbases:
+    def __init__(self, directory=DIRECTORY):
+        # Map whichever endings have been generated; probes for the rest
+        # return None.
+        self.tables = {}
+        self.files = []
+        for kind, name in ENDINGS.items():
+            path = os.path.join(directory, name + ".bin")
+            if os.path.exists(path):
+                f = open(path, "rb")
+                self.files.append(f)
+                self.tables[kind] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for f in self.files:
+            f.close()
+        self.tables, self.files = {}, []
+
+    def probe(self, board):
+        # 1 if the side to move wins with best play, -1 if it loses, 0 for a
+        # draw and None for positions no loaded table covers.
+        white, black = board.piece_lists
+        if len(white) + len(black) != 3 or not self.tables:
+            return None
+        strong = WHITE if len(white) == 2 else BLACK
+        piece = next(sq for sq in board.piece_lists[strong] if board.squares[sq] & 7 != KING)
+        table = self.tables.get(board.squares[piece] & 7)
+        if table is None:
+            return None
+        wk, bk = board.kings[strong], board.kings[strong ^ 1]
+        if strong == BLACK:
+            wk, piece, bk = wk ^ 56, piece ^ 56, bk ^ 56
+        index = wk << 12 | piece << 6 | bk
+        if board.turn == strong:
+            return table[index >> 3] >> (index & 7) & 1
+        index += SIZE
+        return -(table[index >> 3] >> (index & 7) & 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK win/draw bitbases.")
+    parser.add_argument("--dir", default=DIRECTORY, help="output directory")
+    args = parser.parse_args(argv)
+    generate_all(args.dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
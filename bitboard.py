@@ -0,0 +1,180 @@
+from board import (
+    Board, DIAGONAL_RAYS, KING_DELTAS, KNIGHT_DELTAS, LINEAR_RAYS, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE,
+)
+
+FILE_DELTAS = ((0, 1), (0, -1))
+RANK_DELTAS = ((1, 0), (-1, 0))
+DIAGONAL_DELTAS = ((1, 1), (-1, -1))
+ANTI_DIAGONAL_DELTAS = ((-1, 1), (1, -1))
+
+
+def _walk(sq, df, dr):
+    file, rank = sq & 7, sq >> 3
+    while 0 <= file + df < 8 and 0 <= rank + dr < 8:
+        file, rank = file + df, rank + dr
+        yield rank * 8 + file
+
+
+def _step_mask(sq, deltas):
+    file, rank = sq & 7, sq >> 3
+    mask = 0
+    for df, dr in deltas:
+        if 0 <= file + df < 8 and 0 <= rank + dr < 8:
+            mask |= 1 << (rank + dr) * 8 + file + df
+    return mask
+
+
+def _line_table(sq, deltas):
+    # Attack sets along one line through sq, keyed by the occupancy of the
+    # line with the edge squares masked off - a dict standing in for the
+    # multiply-and-shift index of magic bitboards.
+    rays = [list(_walk(sq, df, dr)) for df, dr in deltas]
+    mask = 0
+    for ray in rays:
+        for t in ray[:-1]:
+            mask |= 1 << t
+    table = {}
+    occupancy = 0
+    while True:
+        attacks = 0
+        for ray in rays:
+            for t in ray:
+                attacks |= 1 << t
+                if occupancy >> t & 1:
+                    break
+        table[occupancy] = attacks
+        occupancy = (occupancy - mask) & mask
+        if not occupancy:
+            break
+    return mask, table
+
+
+KNIGHT_ATTACKS = tuple(_step_mask(sq, KNIGHT_DELTAS) for sq in range(64))
+KING_ATTACKS = tuple(_step_mask(sq, KING_DELTAS) for sq in range(64))
+PAWN_ATTACKS = (
+    tuple(_step_mask(sq, ((-1, 1), (1, 1))) for sq in range(64)),
+    tuple(_step_mask(sq, ((-1, -1), (1, -1))) for sq in range(64)),
+)
+ROOK_LINES = tuple(_line_table(sq, FILE_DELTAS) + _line_table(sq, RANK_DELTAS) for sq in range(64))
+BISHOP_LINES = tuple(_line_table(sq, DIAGONAL_DELTAS) + _line_table(sq, ANTI_DIAGONAL_DELTAS) for sq in range(64))
+
+
+def _between(sq):
+    # Squares strictly between sq and each square on a line through it.
+    between = [0] * 64
+    for ray in DIAGONAL_RAYS[sq] + LINEAR_RAYS[sq]:
+        mask = 0
+        for t in ray:
+            between[t] = mask
+            mask |= 1 << t
+    return tuple(between)
+
+
+ALL_SQUARES = (1 << 64) - 1
+FILE_A, FILE_H = 0x0101010101010101, 0x8080808080808080
+RANK_3, RANK_6 = 0xFF << 16, 0xFF << 40
+BETWEEN = tuple(_between(sq) for sq in range(64))
+
+
+def rook_attacks(sq, occupied):
+    mask1, table1, mask2, table2 = ROOK_LINES[sq]
+    return table1[occupied & mask1] | table2[occupied & mask2]
+
+
+def bishop_attacks(sq, occupied):
+    mask1, table1, mask2, table2 = BISHOP_LINES[sq]
+    return table1[occupied & mask1] | table2[occupied & mask2]
+
+
+# Squares set in each byte of a bitboard, indexed by byte position then value.
+BYTE_SQUARES = tuple(tuple(tuple(offset * 8 + i for i in range(8) if value >> i & 1) for value in range(256))
+                     for offset in range(8))
+
+
+def squares_of(bitboard):
+    # Most masks in move generation are empty or a single square.
+    if not bitboard & bitboard - 1:
+        return [bitboard.bit_length() - 1] if bitboard else []
+    squares = []
+    for offset, value in enumerate(bitboard.to_bytes(8, "little")):
+        if value:
+            squares += BYTE_SQUARES[offset][value]
+    return squares
+
+
+class BitBoard(Board):
+    __slots__ = ("occupied", "bitboards")
+
+    def clear(self):
+        super().clear()
+        self.occupied = [0, 0]
+        self.bitboards = [0] * 16
+
+    def copy(self):
+        board = super().copy()
+        board.occupied = list(self.occupied)
+        board.bitboards = list(self.bitboards)
+        return board
+
+    def put(self, sq, piece):
+        super().put(sq, piece)
+        if piece:
+            self.occupied[piece >> 3] |= 1 << sq
+            self.bitboards[piece] |= 1 << sq
+
+    def remove(self, sq):
+        piece = super().remove(sq)
+        if piece:
+            self.occupied[piece >> 3] &= ~(1 << sq)
+            self.bitboards[piece] &= ~(1 << sq)
+        return piece
+
+    def move(self, src, dst):
+        piece = self.squares[src]
+        captured = super().move(src, dst)
+        bits = 1 << src | 1 << dst
+        self.occupied[piece >> 3] ^= bits
+        self.bitboards[piece] ^= bits
+        return captured
+
+    def is_attacked(self, sq, by_color, occupied=None):
+        # occupied overrides the blockers sliders see, e.g. with the king lifted.
+        bitboards = self.bitboards
+        base = by_color << 3
+        if (KNIGHT_ATTACKS[sq] & bitboards[KNIGHT | base] or KING_ATTACKS[sq] & bitboards[KING | base]
+                or PAWN_ATTACKS[by_color ^ 1][sq] & bitboards[PAWN | base]):
+            return True
+        if occupied is None:
+            occupied = self.occupied[0] | self.occupied[1]
+        queens = bitboards[QUEEN | base]
+        return bool(bishop_attacks(sq, occupied) & (bitboards[BISHOP | base] | queens)
+                    or rook_attacks(sq, occupied) & (bitboards[ROOK | base] | queens))
+
+    def piece_moves(self, sq, piece=None):
+        if piece is None:
+            piece = self.squares[sq]
+        if not piece:
+            return []
+        color, kind = piece >> 3, piece & 7
+        own, enemy = self.occupied[color], self.occupied[color ^ 1]
+
+        if kind == PAWN:
+            occupied = own | enemy
+            step, start_rank = (8, 1) if color == WHITE else (-8, 6)
+            targets = PAWN_ATTACKS[color][sq] & enemy
+            front = sq + step
+            if 0 <= front < 64 and not occupied >> front & 1:
+                targets |= 1 << front
+                if sq >> 3 == start_rank and not occupied >> front + step & 1:
+                    targets |= 1 << front + step
+        elif kind == KNIGHT:
+            targets = KNIGHT_ATTACKS[sq] & ~own
+        elif kind == KING:
+            targets = KING_ATTACKS[sq] & ~own
+        elif kind == BISHOP:
+            targets = bishop_attacks(sq, own | enemy) & ~own
+        elif kind == ROOK:
+            targets = rook_attacks(sq, own | enemy) & ~own
+        else:
+            targets = (bishop_attacks(sq, own | enemy) | rook_attacks(sq, own | enemy)) & ~own
+        return squares_of(targets)
@@ -0,0 +1,431 @@
+from array import array
+
+from pst import PHASES, PSQT
+from zobrist import CASTLING_KEYS, EP_KEYS, PAWN_KING_KEYS, PIECE_KEYS, TURN_KEY
+
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+WHITE, BLACK = 0, 1
+COLORS = ("white", "black")
+COLOR_CODES = {"white": WHITE, "black": BLACK}
+KINDS = ("", "pawn", "knight", "bishop", "rook", "queen", "king")
+
+# A piece code is its kind in the low three bits and its colour in bit 3,
+# so white pieces are 1-6, black pieces 9-14 and an empty square is 0.
+PIECE_NAMES = [""] * 16
+PIECE_CODES = {"": EMPTY}
+for _color, _color_name in enumerate(COLORS):
+    for _kind in range(PAWN, KING + 1):
+        PIECE_NAMES[_kind | _color << 3] = f"{_color_name}_{KINDS[_kind]}"
+        PIECE_CODES[f"{_color_name}_{KINDS[_kind]}"] = _kind | _color << 3
+
+BACK_RANK = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# FEN letter of each piece code, and the reverse mapping.
+FEN_CHARS = ".PNBRQK..pnbrqk."
+FEN_CODES = {char: code for code, char in enumerate(FEN_CHARS) if char != "."}
+
+# Moves are 16-bit ints: from square in bits 0-5, to square in bits 6-11 and
+# flags in bits 12-15. Promotion flags carry the new piece in their low two
+# bits (knight, bishop, rook, queen) and set CAPTURE when they capture.
+QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EP_CAPTURE = 0, 1, 2, 3, 4, 5
+PROMOTION = 8
+
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+# Castling rights that survive a move from or to each square.
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[7] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASKS[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[63] &= ~BLACK_KINGSIDE
+
+# Undo entries are packed into one 64-bit word: the move in bits 0-15, the
+# captured piece in 16-19, castling rights in 20-23, the en passant square
+# (64 for none) in 24-30 and the halfmove clock from bit 31 up.
+MAX_PLY = 1024
+NO_EP = 64
+
+
+# Squares are numbered a1 = 0 .. h8 = 63; the UI works in [x, y] with y = 0 on the 8th rank.
+def square(x, y):
+    return (7 - y) * 8 + x
+
+
+def coords(sq):
+    return [sq & 7, 7 - (sq >> 3)]
+
+
+def square_name(sq):
+    return f"{chr(97 + (sq & 7))}{(sq >> 3) + 1}"
+
+
+def parse_square(name):
+    if len(name) != 2 or name[0] not in "abcdefgh" or name[1] not in "12345678":
+        raise ValueError(f"Invalid square: {name!r}")
+    return (int(name[1]) - 1) * 8 + ord(name[0]) - 97
+
+
+def encode_move(src, dst, flags=QUIET):
+    return src | dst << 6 | flags << 12
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_flags(move):
+    return move >> 12
+
+
+def promotion_piece(move):
+    flags = move >> 12
+    return (flags & 3) + KNIGHT if flags & PROMOTION else EMPTY
+
+
+def move_name(move):
+    promotion = promotion_piece(move)
+    return square_name(move & 63) + square_name(move >> 6 & 63) + ("nbrq"[promotion - KNIGHT] if promotion else "")
+
+
+def _steps(sq, deltas):
+    file, rank = sq & 7, sq >> 3
+    return tuple((rank + dr) * 8 + file + df for df, dr in deltas
+                 if 0 <= file + df < 8 and 0 <= rank + dr < 8)
+
+
+def _ray(sq, df, dr):
+    file, rank = sq & 7, sq >> 3
+    ray = []
+    while 0 <= file + df < 8 and 0 <= rank + dr < 8:
+        file, rank = file + df, rank + dr
+        ray.append(rank * 8 + file)
+    return tuple(ray)
+
+
+KNIGHT_DELTAS = ((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2))
+KING_DELTAS = ((0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1))
+DIAGONAL_DELTAS = ((-1, -1), (1, 1), (-1, 1), (1, -1))
+LINEAR_DELTAS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+KNIGHT_TARGETS = tuple(_steps(sq, KNIGHT_DELTAS) for sq in range(64))
+KING_TARGETS = tuple(_steps(sq, KING_DELTAS) for sq in range(64))
+# Squares a pawn of the given colour attacks from each square.
+PAWN_ATTACKS = (
+    tuple(_steps(sq, ((-1, 1), (1, 1))) for sq in range(64)),
+    tuple(_steps(sq, ((-1, -1), (1, -1))) for sq in range(64)),
+)
+DIAGONAL_RAYS = tuple(tuple(r for r in (_ray(sq, df, dr) for df, dr in DIAGONAL_DELTAS) if r) for sq in range(64))
+LINEAR_RAYS = tuple(tuple(r for r in (_ray(sq, df, dr) for df, dr in LINEAR_DELTAS) if r) for sq in range(64))
+SLIDER_RAYS = {
+    BISHOP: DIAGONAL_RAYS,
+    ROOK: LINEAR_RAYS,
+    QUEEN: tuple(d + l for d, l in zip(DIAGONAL_RAYS, LINEAR_RAYS)),
+}
+
+
+def square_attacked(squares, sq, by_color):
+    # Probe outward from the target square for an attacker of each kind
+    # instead of generating the moves of every enemy piece.
+    base = by_color << 3
+    pawn, knight, king, queen = PAWN | base, KNIGHT | base, KING | base, QUEEN | base
+    for t in PAWN_ATTACKS[by_color ^ 1][sq]:
+        if squares[t] == pawn:
+            return True
+    for t in KNIGHT_TARGETS[sq]:
+        if squares[t] == knight:
+            return True
+    for t in KING_TARGETS[sq]:
+        if squares[t] == king:
+            return True
+    for rays, slider in ((DIAGONAL_RAYS, BISHOP | base), (LINEAR_RAYS, ROOK | base)):
+        for ray in rays[sq]:
+            for t in ray:
+                piece = squares[t]
+                if piece:
+                    if piece == slider or piece == queen:
+                        return True
+                    break
+    return False
+
+
+class Board:
+    __slots__ = ("squares", "piece_lists", "kings", "turn", "castling", "ep_square", "halfmove_clock",
+                 "fullmove_number", "undo_stack", "ply", "key", "key_stack", "psqt", "phase", "pawn_key")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.squares = bytearray(64)
+        self.piece_lists = ([], [])
+        self.kings = [None, None]
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.undo_stack = array("Q", bytes(8 * MAX_PLY))
+        self.key_stack = array("Q", bytes(8 * MAX_PLY))
+        self.ply = 0
+        self.key = TURN_KEY
+        # Running evaluation terms, kept up to date by put, remove and move.
+        self.psqt = 0
+        self.phase = 0
+        self.pawn_key = 0
+
+    def reset(self):
+        self.clear()
+        for file, kind in enumerate(BACK_RANK):
+            self.put(file, kind)
+            self.put(8 + file, PAWN)
+            self.put(48 + file, PAWN | BLACK << 3)
+            self.put(56 + file, kind | BLACK << 3)
+        self.castling = ALL_CASTLING
+        self.key ^= CASTLING_KEYS[ALL_CASTLING]
+
+    def set_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN piece placement: {fields[0]!r}")
+
+        self.clear()
+        for rank, row in zip(range(7, -1, -1), ranks):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                elif char in FEN_CODES and file < 8:
+                    self.put(rank * 8 + file, FEN_CODES[char])
+                    file += 1
+                else:
+                    raise ValueError(f"Invalid FEN piece placement: {fields[0]!r}")
+            if file != 8:
+                raise ValueError(f"Invalid FEN piece placement: {fields[0]!r}")
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN side to move: {fields[1]!r}")
+        self.turn = WHITE if fields[1] == "w" else BLACK
+        self.castling = 0
+        for char in fields[2].replace("-", ""):
+            if char not in "KQkq":
+                raise ValueError(f"Invalid FEN castling rights: {fields[2]!r}")
+            self.castling |= 1 << "KQkq".index(char)
+        self.ep_square = None if fields[3] == "-" else parse_square(fields[3])
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.refresh_key()
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row, empty = "", 0
+            for piece in self.squares[rank * 8:rank * 8 + 8]:
+                if piece:
+                    row += (str(empty) if empty else "") + FEN_CHARS[piece]
+                    empty = 0
+                else:
+                    empty += 1
+            rows.append(row + (str(empty) if empty else ""))
+        castling = "".join(char for bit, char in enumerate("KQkq") if self.castling >> bit & 1) or "-"
+        ep = "-" if self.ep_square is None else square_name(self.ep_square)
+        return f"{'/'.join(rows)} {'wb'[self.turn]} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+    def copy(self):
+        board = self.__class__.__new__(self.__class__)
+        board.squares = bytearray(self.squares)
+        board.piece_lists = (list(self.piece_lists[WHITE]), list(self.piece_lists[BLACK]))
+        board.kings = list(self.kings)
+        board.turn, board.castling, board.ep_square = self.turn, self.castling, self.ep_square
+        board.halfmove_clock, board.fullmove_number = self.halfmove_clock, self.fullmove_number
+        board.undo_stack = array("Q", self.undo_stack)
+        board.key_stack = array("Q", self.key_stack)
+        board.ply, board.key = self.ply, self.key
+        board.psqt, board.phase, board.pawn_key = self.psqt, self.phase, self.pawn_key
+        return board
+
+    def put(self, sq, piece):
+        if self.squares[sq]:
+            self.remove(sq)
+        if piece:
+            self.squares[sq] = piece
+            self.piece_lists[piece >> 3].append(sq)
+            self.key ^= PIECE_KEYS[piece][sq]
+            self.pawn_key ^= PAWN_KING_KEYS[piece][sq]
+            self.psqt += PSQT[piece][sq]
+            self.phase += PHASES[piece]
+            if piece & 7 == KING:
+                self.kings[piece >> 3] = sq
+
+    def remove(self, sq):
+        piece = self.squares[sq]
+        if piece:
+            self.squares[sq] = EMPTY
+            self.piece_lists[piece >> 3].remove(sq)
+            self.key ^= PIECE_KEYS[piece][sq]
+            self.pawn_key ^= PAWN_KING_KEYS[piece][sq]
+            self.psqt -= PSQT[piece][sq]
+            self.phase -= PHASES[piece]
+            if piece & 7 == KING and self.kings[piece >> 3] == sq:
+                self.kings[piece >> 3] = None
+        return piece
+
+    def move(self, src, dst):
+        captured = self.remove(dst)
+        piece = self.squares[src]
+        self.squares[src] = EMPTY
+        self.squares[dst] = piece
+        pieces = self.piece_lists[piece >> 3]
+        pieces[pieces.index(src)] = dst
+        self.key ^= PIECE_KEYS[piece][src] ^ PIECE_KEYS[piece][dst]
+        self.pawn_key ^= PAWN_KING_KEYS[piece][src] ^ PAWN_KING_KEYS[piece][dst]
+        self.psqt += PSQT[piece][dst] - PSQT[piece][src]
+        if piece & 7 == KING:
+            self.kings[piece >> 3] = dst
+        return captured
+
+    def make_move(self, move):
+        src, dst, flags = move & 63, move >> 6 & 63, move >> 12
+        piece = self.squares[src]
+        color = piece >> 3
+        if self.ply == len(self.undo_stack):
+            self.undo_stack.extend(array("Q", bytes(8 * MAX_PLY)))
+            self.key_stack.extend(array("Q", bytes(8 * MAX_PLY)))
+        self.undo_stack[self.ply] = (move | self.squares[dst] << 16 | self.castling << 20
+                                     | (NO_EP if self.ep_square is None else self.ep_square) << 24
+                                     | self.halfmove_clock << 31)
+        self.key_stack[self.ply] = self.key
+        self.ply += 1
+        castling = self.castling
+        self.key ^= self._ep_key()
+
+        captured = self.move(src, dst)
+        if flags == EP_CAPTURE:
+            captured = self.remove(dst - 8 if color == WHITE else dst + 8)
+        if flags & PROMOTION:
+            self.put(dst, (flags & 3) + KNIGHT | color << 3)
+        elif flags == KING_CASTLE:
+            self.move(dst + 1, dst - 1)
+        elif flags == QUEEN_CASTLE:
+            self.move(dst - 2, dst + 1)
+        self.castling &= CASTLING_MASKS[src] & CASTLING_MASKS[dst]
+        self.ep_square = (src + dst) >> 1 if flags == DOUBLE_PUSH else None
+        self.halfmove_clock = 0 if captured or piece & 7 == PAWN else self.halfmove_clock + 1
+        self.fullmove_number += color
+        self.turn ^= 1
+        self.key ^= CASTLING_KEYS[castling] ^ CASTLING_KEYS[self.castling] ^ TURN_KEY ^ self._ep_key()
+        return captured
+
+    def unmake_move(self):
+        self.ply -= 1
+        entry = self.undo_stack[self.ply]
+        move = entry & 0xFFFF
+        src, dst, flags = move & 63, move >> 6 & 63, move >> 12
+        self.turn ^= 1
+        color = self.turn
+
+        if flags & PROMOTION:
+            self.put(dst, PAWN | color << 3)
+        elif flags == KING_CASTLE:
+            self.move(dst - 1, dst + 1)
+        elif flags == QUEEN_CASTLE:
+            self.move(dst + 1, dst - 2)
+        self.move(dst, src)
+        if flags == EP_CAPTURE:
+            self.put(dst - 8 if color == WHITE else dst + 8, PAWN | (color ^ 1) << 3)
+        elif entry >> 16 & 15:
+            self.put(dst, entry >> 16 & 15)
+
+        self.castling = entry >> 20 & 15
+        ep_square = entry >> 24 & 127
+        self.ep_square = None if ep_square == NO_EP else ep_square
+        self.halfmove_clock = entry >> 31
+        self.fullmove_number -= color
+        self.key = self.key_stack[self.ply]
+        return move
+
+    def last_move(self):
+        return self.undo_stack[self.ply - 1] & 0xFFFF if self.ply else None
+
+    def _ep_key(self):
+        ep = self.ep_square
+        if ep is not None:
+            pawn = PAWN | self.turn << 3
+            for sq in PAWN_ATTACKS[self.turn ^ 1][ep]:
+                if self.squares[sq] == pawn:
+                    return EP_KEYS[ep & 7]
+        return 0
+
+    def compute_key(self):
+        key = CASTLING_KEYS[self.castling] ^ self._ep_key() ^ (TURN_KEY if self.turn == WHITE else 0)
+        for pieces in self.piece_lists:
+            for sq in pieces:
+                key ^= PIECE_KEYS[self.squares[sq]][sq]
+        return key
+
+    def refresh_key(self):
+        self.key = self.compute_key()
+
+    def repetition_count(self):
+        # Only positions since the last capture or pawn move with the same
+        # side to move can repeat the current one.
+        count = 1
+        for ply in range(self.ply - 2, max(self.ply - self.halfmove_clock, 0) - 1, -2):
+            if self.key_stack[ply] == self.key:
+                count += 1
+        return count
+
+    def piece_moves(self, sq, piece=None):
+        squares = self.squares
+        if piece is None:
+            piece = squares[sq]
+        if not piece:
+            return []
+        color, kind = piece >> 3, piece & 7
+
+        if kind == PAWN:
+            return self._pawn_moves(sq, color)
+        if kind == KNIGHT or kind == KING:
+            targets = KNIGHT_TARGETS[sq] if kind == KNIGHT else KING_TARGETS[sq]
+            return [t for t in targets if not squares[t] or squares[t] >> 3 != color]
+
+        moves = []
+        for ray in SLIDER_RAYS[kind][sq]:
+            for t in ray:
+                target = squares[t]
+                if target:
+                    if target >> 3 != color:
+                        moves.append(t)
+                    break
+                moves.append(t)
+        return moves
+
+    def _pawn_moves(self, sq, color):
+        squares = self.squares
+        moves = []
+        step, start_rank = (8, 1) if color == WHITE else (-8, 6)
+        front = sq + step
+        if 0 <= front < 64 and not squares[front]:
+            moves.append(front)
+            if sq >> 3 == start_rank and not squares[front + step]:
+                moves.append(front + step)
+        for t in PAWN_ATTACKS[color][sq]:
+            if squares[t] and squares[t] >> 3 != color:
+                moves.append(t)
+        return moves
+
+    def is_attacked(self, sq, by_color):
+        return square_attacked(self.squares, sq, by_color)
+
+    def is_in_check(self, color):
+        king = self.kings[color]
+        return king is not None and self.is_attacked(king, color ^ 1)
@@ -0,0 +1,87 @@
+import mmap
+import random
+import struct
+
+from board import KING, KING_CASTLE, QUEEN_CASTLE, ROOK, promotion_piece
+from movegen import legal_moves
+
+# Polyglot entries are 16 big-endian bytes: the position key, the move, a
+# weight and a learn field, sorted by key.
+ENTRY = struct.Struct(">QHHI")
+
+
+class OpeningBook:
+    def __init__(self, path, best=False, seed=None):
+        # The file is mapped read-only: nothing is parsed up front, and worker
+        # processes opening the same book share its pages.
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size() else b""
+        self.count = len(self.data) // ENTRY.size
+        self.best = best
+        self.random = random.Random(seed)
+
+    def size(self):
+        self.file.seek(0, 2)
+        return self.file.tell()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def entries(self, key):
+        # Binary search for the first entry with this key, then read on.
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        while low < self.count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, low * ENTRY.size)
+            if entry_key != key:
+                break
+            yield move, weight
+            low += 1
+
+    def moves(self, board):
+        # Book moves for the position as (encoded move, weight) pairs; any
+        # entry that is not legal here (a key collision) is dropped.
+        found = []
+        legal = None
+        for raw, weight in self.entries(board.key):
+            if legal is None:
+                legal = legal_moves(board)
+            move = _decode(board, raw, legal)
+            if move:
+                found.append((move, weight))
+        return found
+
+    def choose(self, board):
+        moves = [(move, weight) for move, weight in self.moves(board) if weight]
+        if not moves:
+            return 0
+        if self.best:
+            return max(moves, key=lambda entry: entry[1])[0]
+        return self.random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def _decode(board, raw, legal):
+    # Polyglot packs the to-square in bits 0-5, the from-square in 6-11 and
+    # the promotion piece (1 knight .. 4 queen) in 12-14, and writes
+    # castling as the king taking its own rook.
+    dst, src, promotion = raw & 63, raw >> 6 & 63, raw >> 12 & 7
+    king, target = board.squares[src], board.squares[dst]
+    if king & 7 == KING and target == ROOK | (king & 8):
+        flags = KING_CASTLE if dst > src else QUEEN_CASTLE
+        return next((move for move in legal if move & 63 == src and move >> 12 == flags), 0)
+    promoted = promotion + 1 if promotion else 0
+    return next((move for move in legal
+                 if move & 63 == src and move >> 6 & 63 == dst and promotion_piece(move) == promoted), 0)
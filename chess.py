@@ -1,325 +1,228 @@
+from collections.abc import Mapping, Sequence
+
 import pygame
 
+from board import COLORS, PIECE_CODES, PIECE_NAMES, coords, move_from, move_to, promotion_piece, square
+from game_state import GameState
 from piece import Piece
-from utils import Utils
+from utils import TextRenderer
+
+FILES = {file: index for index, file in enumerate("abcdefgh")}
+HIGHLIGHT_COLORS = {"black": (0, 194, 39, 170), "white": (28, 21, 212, 170)}
 
 
-class Chess:
-    def __init__(self, screen, pieces_src, square_coords, square_length):
+class Chess(GameState):
+    def __init__(self, screen, pieces_src, square_coords, square_length, backend="array", table_mb=16,
+                 board_img=None, book=None):
         self.screen = screen
-        self.chess_pieces = Piece(pieces_src, cols=6, rows=2)
+        self.board_img = board_img
+        self.chess_pieces = Piece(pieces_src, cols=6, rows=2, square_length=square_length)
+        self.moves = []
+        self.selected = None
+        self.text = TextRenderer()
+        # What is on screen now, so a frame only redraws what changed.
+        self.drawn_squares = None
+        self.drawn_highlight = {}
+        self.drawn_turn = None
+        self.square_length = None
+        self.resize(square_coords, square_length)
+        super().__init__(backend, table_mb, verbose=True, book=book)
+
+    def resize(self, square_coords, square_length):
+        # Sprites, highlights and the board layer are scaled here once, not per frame.
         self.board_locations = square_coords
+        self.board_offset_x, self.board_offset_y = square_coords[0][0]
+        self.drawn_squares, self.drawn_turn = None, None
+        if square_length == self.square_length:
+            return
         self.square_length = square_length
-        self.turn = {"black": 0, "white": 0}
-        self.moves = []
-        self.utils = Utils()
-        self.pieces = {
-            "white_pawn": 5, "white_knight": 3, "white_bishop": 2,
-            "white_rook": 4, "white_king": 0, "white_queen": 1,
-            "black_pawn": 11, "black_knight": 9, "black_bishop": 8,
-            "black_rook": 10, "black_king": 6, "black_queen": 7
-        }
-        self.captured = []
-        self.winner = ""
-        self.reset()
+        self.chess_pieces.resize(square_length)
+        self.highlights = {}
+        for color, fill in HIGHLIGHT_COLORS.items():
+            self.highlights[color] = pygame.Surface((square_length, square_length), pygame.SRCALPHA)
+            self.highlights[color].fill(fill)
+        self.board_layer = None
+        if self.board_img is not None:
+            size = square_length * 8, square_length * 8
+            layer = self.board_img
+            if layer.get_size() != size:
+                layer = pygame.transform.smoothscale(layer, size)
+            self.board_layer = layer.convert()
 
     def reset(self):
         self.moves = []
-        self.turn["white"], self.turn["black"] = 1, 0
-        self.piece_location = {chr(i): {a: ["", False, [x, 8 - a]] for a in range(1, 9)} for x, i in
-                               enumerate(range(97, 105))}
-        self._initialize_board()
-
-    def _initialize_board(self):
-        for file, rank in self.piece_location.items():
-            for row in range(1, 9):
-                if row == 1:
-                    rank[row][0] = {"a": "white_rook", "h": "white_rook", "b": "white_knight", "g": "white_knight",
-                                    "c": "white_bishop", "f": "white_bishop", "d": "white_queen",
-                                    "e": "white_king"}.get(file, "")
-                elif row == 2:
-                    rank[row][0] = "white_pawn"
-                elif row == 7:
-                    rank[row][0] = "black_pawn"
-                elif row == 8:
-                    rank[row][0] = {"a": "black_rook", "h": "black_rook", "b": "black_knight", "g": "black_knight",
-                                    "c": "black_bishop", "f": "black_bishop", "d": "black_queen",
-                                    "e": "black_king"}.get(file, "")
+        self.selected = None
+        super().reset()
+
+    @property
+    def piece_location(self):
+        return PieceLocationView(self)
 
     def play_turn(self):
-        white_color = (255, 255, 255)
-        small_font = pygame.font.SysFont("comicsansms", 20)
-        turn_text = small_font.render(f"Turn: {'Black' if self.turn['black'] else 'White'}", True, white_color)
+        # The engine runs on a worker thread; keep rendering until its move arrives.
+        if self.board.turn == self.computer and not self.pending_promotion:
+            self.poll_computer()
+
+    def click(self, position):
+        # One call per button press, from the event loop.
+        if self.winner or self.pending_promotion or self.board.turn == self.computer:
+            return
+        self.move_piece(COLORS[self.board.turn], position)
+
+    def render(self, full=False):
+        # Draw the turn label and the squares that changed since the last
+        # call (everything when full); returns the screen rects touched.
+        if full:
+            self.drawn_squares, self.drawn_turn = None, None
+        rects = self.draw_pieces()
+        turn_rect = self.draw_turn()
+        if turn_rect:
+            rects.append(turn_rect)
+        return rects
+
+    def draw_turn(self):
+        label = f"Turn: {'Black' if self.turn['black'] else 'White'}"
+        outcome = self.endgame_outcome()
+        if outcome:
+            label += f"  ({outcome})"
+        if label == self.drawn_turn:
+            return None
+        self.drawn_turn = label
+        turn_text = self.text.render(label, 20, (255, 255, 255))
+        rect = pygame.Rect(0, 0, self.screen.get_width(), self.board_locations[0][0][1])
+        self.screen.fill((0, 0, 0), rect)
         self.screen.blit(turn_text, ((self.screen.get_width() - turn_text.get_width()) // 2, 10))
-        self.move_piece("black" if self.turn["black"] else "white")
+        return rect
 
     def draw_pieces(self):
-        colors = {
-            "black": (0, 194, 39, 170),
-            "white": (28, 21, 212, 170)
-        }
-
-        surfaces = {
-            "black": pygame.Surface((self.square_length, self.square_length), pygame.SRCALPHA),
-            "white": pygame.Surface((self.square_length, self.square_length), pygame.SRCALPHA)
-        }
-        for color, surface in surfaces.items():
-            surface.fill(colors[color])
-
-        for val in self.piece_location.values():
-            for value in val.values():
-                piece_name, is_selected, (piece_x, piece_y) = value
-                if is_selected and piece_name.startswith(("black", "white")):
-                    color = "black" if piece_name.startswith("black") else "white"
-                    self.screen.blit(surfaces[color], self.board_locations[piece_x][piece_y])
-                    for move in self.moves:
-                        if all(0 <= coord < 8 for coord in move):
-                            self.screen.blit(surfaces[color], self.board_locations[move[0]][move[1]])
-
-        for val in self.piece_location.values():
-            for value in val.values():
-                piece_name, _, (piece_x, piece_y) = value
-                if piece_name:
-                    self.chess_pieces.draw(self.screen, piece_name, self.board_locations[piece_x][piece_y])
-
-    def possible_moves(self, piece_name, piece_coord):
-        positions = []
-        if not piece_name:
-            return positions
-
-        x_coord, y_coord = piece_coord
-
-        if piece_name.endswith("bishop"):
-            positions = self.diagonal_moves(positions, piece_name, piece_coord)
-
-        elif piece_name.endswith("pawn"):
-            positions = self._pawn_moves(piece_name, x_coord, y_coord)
-
-        elif piece_name.endswith("rook"):
-            positions = self.linear_moves(positions, piece_name, piece_coord)
-
-        elif piece_name.endswith("knight"):
-            knight_moves = [
-                (x_coord - 2, y_coord - 1), (x_coord - 2, y_coord + 1),
-                (x_coord + 2, y_coord - 1), (x_coord + 2, y_coord + 1),
-                (x_coord - 1, y_coord - 2), (x_coord - 1, y_coord + 2),
-                (x_coord + 1, y_coord - 2), (x_coord + 1, y_coord + 2)
-            ]
-            positions = [[x, y] for x, y in knight_moves if 0 <= x < 8 and 0 <= y < 8]
-
-        elif piece_name.endswith("king"):
-            king_moves = [
-                (x_coord, y_coord - 1), (x_coord, y_coord + 1),
-                (x_coord - 1, y_coord), (x_coord + 1, y_coord),
-                (x_coord - 1, y_coord - 1), (x_coord - 1, y_coord + 1),
-                (x_coord + 1, y_coord - 1), (x_coord + 1, y_coord + 1)
-            ]
-            positions = [[x, y] for x, y in king_moves if 0 <= x < 8 and 0 <= y < 8]
-
-        elif piece_name.endswith("queen"):
-            positions = self.diagonal_moves(positions, piece_name, piece_coord)
-            positions = self.linear_moves(positions, piece_name, piece_coord)
-
-        return self._filter_positions(piece_name, positions)
-
-    def _pawn_moves(self, piece_name, x_coord, y_coord):
-        positions = []
-        column_char = chr(97 + x_coord)
-        row_no = 8 - y_coord
-        direction = 1 if piece_name == "black_pawn" else -1
-        start_row = 1 if piece_name == "black_pawn" else 6
-
-        if 0 <= y_coord + direction < 8:
-            row_no -= direction
-            front_piece = self.piece_location[column_char][row_no][0]
-            if not front_piece:
-                positions.append([x_coord, y_coord + direction])
-                if y_coord == start_row:
-                    row_no -= direction
-                    front_piece = self.piece_location[column_char][row_no][0]
-                    if not front_piece:
-                        positions.append([x_coord, y_coord + 2 * direction])
-
-        for dx in [-1, 1]:
-            nx, ny = x_coord + dx, y_coord + direction
-            if 0 <= nx < 8 and 0 <= ny < 8:
-                column_char = chr(97 + nx)
-                row_no = 8 - ny
-                to_capture = self.piece_location[column_char][row_no]
-                if to_capture[0].startswith("white" if piece_name == "black_pawn" else "black"):
-                    positions.append([nx, ny])
-
-        return positions
-
-    def _filter_positions(self, piece_name, positions):
-        to_remove = []
-        for x, y in positions:
-            column_char = chr(97 + x)
-            row_no = 8 - y
-            des_piece_name = self.piece_location[column_char][row_no][0]
-            if des_piece_name.startswith(piece_name[:5]):
-                to_remove.append([x, y])
-        return [pos for pos in positions if pos not in to_remove]
-
-    def move_piece(self, turn):
-        square = self.get_selected_square()
-        if not square:
+        highlight = {}
+        if self.selected is not None:
+            color = COLORS[self.board.squares[self.selected] >> 3]
+            for sq in [self.selected] + [move_to(move) for move in self.moves]:
+                highlight[sq] = color
+
+        squares = self.board.squares
+        if self.drawn_squares is None:
+            dirty = range(64)
+        else:
+            dirty = {sq for sq in range(64) if squares[sq] != self.drawn_squares[sq]}
+            dirty.update(sq for sq, _ in highlight.items() ^ self.drawn_highlight.items())
+        self.drawn_squares, self.drawn_highlight = bytearray(squares), highlight
+
+        rects = []
+        length = self.square_length
+        for sq in dirty:
+            x, y = coords(sq)
+            location = self.board_locations[x][y]
+            rect = pygame.Rect(location, (length, length))
+            if self.board_layer is None:
+                self.screen.fill((0, 0, 0), rect)
+            else:
+                self.screen.blit(self.board_layer, location, (x * length, y * length, length, length))
+            if sq in highlight:
+                self.screen.blit(self.highlights[highlight[sq]], location)
+            if squares[sq]:
+                self.chess_pieces.draw(self.screen, squares[sq], location)
+            rects.append(rect)
+        return rects
+
+    def move_piece(self, turn, position):
+        square_info = self.get_selected_square(position)
+        if not square_info:
             return
 
-        piece_name, column_char, row_no = square
-        piece_color = piece_name[:5]
-        x, y = self.piece_location[column_char][row_no][2]
-
-        if piece_name and piece_color == turn:
-            self.moves = self.possible_moves(piece_name, [x, y])
-            for k, v in self.piece_location.items():
-                for key in v:
-                    v[key][1] = False
-            self.piece_location[column_char][row_no][1] = True
-
-        for move in self.moves:
-            if move == [x, y]:
-                if not self.piece_location[column_char][row_no][0] or piece_color == turn:
-                    self.validate_move([x, y])
-                else:
-                    self.capture_piece([column_char, row_no], [x, y])
-
-    def get_selected_square(self):
-        if self.utils.left_click_event():
-            mouse_event = self.utils.get_mouse_event()
-            for i, row in enumerate(self.board_locations):
-                for j, loc in enumerate(row):
-                    rect = pygame.Rect(loc[0], loc[1], self.square_length, self.square_length)
-                    if rect.collidepoint(mouse_event):
-                        selected = [rect.x, rect.y]
-                        for k, board_row in enumerate(self.board_locations):
-                            try:
-                                l = board_row.index(selected)
-                                for val in self.piece_location.values():
-                                    for piece in val.values():
-                                        if not piece[1]:
-                                            piece[1] = False
-                                column_char, row_no = chr(97 + k), 8 - l
-                                piece_name = self.piece_location[column_char][row_no][0]
-                                return [piece_name, column_char, row_no]
-                            except ValueError:
-                                pass
+        piece_name, column_char, row_no = square_info
+        sq = (row_no - 1) * 8 + ord(column_char) - 97
+
+        if piece_name and piece_name[:5] == turn:
+            self.moves = [move for move in self.legal_moves() if move_from(move) == sq]
+            self.selected = sq
+        elif any(move_to(move) == sq for move in self.moves):
+            self.validate_move(coords(sq))
+
+    def square_at(self, position):
+        x = (position[0] - self.board_offset_x) // self.square_length
+        y = (position[1] - self.board_offset_y) // self.square_length
+        if 0 <= x < 8 and 0 <= y < 8:
+            return square(x, y)
         return None
 
+    def get_selected_square(self, position):
+        sq = self.square_at(position)
+        if sq is None:
+            return None
+        return [PIECE_NAMES[self.board.squares[sq]], chr(97 + (sq & 7)), (sq >> 3) + 1]
+
     def validate_move(self, destination):
-        des_col = chr(97 + destination[0])
-        des_row = 8 - destination[1]
-
-        for col, rows in self.piece_location.items():
-            for row, board_piece in rows.items():
-                if board_piece[1]:
-                    board_piece[1] = False
-                    piece_name = board_piece[0]
-                    self.piece_location[des_col][des_row][0] = piece_name
-                    self.piece_location[col][row][0] = ""
-                    self.turn["black"], self.turn["white"] = int(not self.turn["black"]), int(not self.turn["white"])
-                    src_location = f"{col}{row}"
-                    des_location = f"{des_col}{des_row}"
-                    print(f"{piece_name} moved from {src_location} to {des_location}")
-
-                    if self.turn["black"] and self.is_king_in_check("white"):
-                        print("White is still in check and did not address it - Black wins!")
-                        self.winner = "Black"
-                    elif self.turn["white"] and self.is_king_in_check("black"):
-                        print("Black is still in check and did not address it - White wins!")
-                        self.winner = "White"
-                    return
-
-    def diagonal_moves(self, positions, piece_name, piece_coord):
-        directions = [(-1, -1), (1, 1), (-1, 1), (1, -1)]
-        for dx, dy in directions:
-            x, y = piece_coord
-            while True:
-                x += dx
-                y += dy
-                if not (0 <= x <= 7 and 0 <= y <= 7):
-                    break
-                positions.append([x, y])
-                column_char = chr(97 + x)
-                row_no = 8 - y
-                p = self.piece_location[column_char][row_no]
-                if len(p[0]) > 0 and piece_name[:5] != p[:5]:
-                    break
-        return positions
-
-    def linear_moves(self, positions, piece_name, piece_coord):
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        for dx, dy in directions:
-            x, y = piece_coord
-            while 0 <= x + dx < 8 and 0 <= y + dy < 8:
-                x += dx
-                y += dy
-                positions.append([x, y])
-                column_char = chr(97 + x)
-                row_no = 8 - y
-                p = self.piece_location[column_char][row_no]
-                if len(p[0]) > 0 and piece_name[:5] != p[:5]:
-                    break
-        return positions
-
-    def capture_piece(self, chess_board_coord, piece_coord):
-        column_char, row_no = chess_board_coord
-        p = self.piece_location[column_char][row_no]
-
-        # Проверка, что король действительно захватывается, а не просто двигается
-        if p[0] == "white_king" and self.is_king_in_check('white'):
-            self.winner = "Black"
-            print("Black wins")
-        elif p[0] == "black_king" and self.is_king_in_check('black'):
-            self.winner = "White"
-            print("White wins")
-
-        self.captured.append(p)
-        self.validate_move(piece_coord)
-
-    def is_king_in_check(self, color):
-        king_position = self.find_king(color)
-        return self.is_position_attacked(king_position, color)
-
-    def is_king_in_checkmate(self, king_color):
-        if not self.is_king_in_check(king_color):
-            return False
-        king_position = self.find_king(king_color)
-        possible_moves = self.possible_moves(f"{king_color}_king", king_position)
-
-        for move in possible_moves:
-            if not self.is_position_attacked(move, king_color):
-                return False
-
-        return True
-
-    def find_king(self, king_color):
-        king_name = f"{king_color}_king"
-        for col, rows in self.piece_location.items():
-            for row, piece in rows.items():
-                if piece[0] == king_name:
-                    return [ord(col) - 97, 8 - row]
-
-    def is_position_attacked(self, position, king_color):
-        opponent_color = "black" if king_color == "white" else "white"
-        for col, rows in self.piece_location.items():
-            for row, piece in rows.items():
-                if piece[0].startswith(opponent_color):
-                    piece_moves = self.possible_moves(piece[0], [ord(col) - 97, 8 - row])
-                    if position in piece_moves:
-                        return True
-        return False
-
-    def simulate_move(self, original_position, move):
-        col, row = chr(97 + original_position[0]), 8 - original_position[1]
-        target_col, target_row = chr(97 + move[0]), 8 - move[1]
-        target_piece = self.piece_location[target_col][target_row][0]
-        self.piece_location[target_col][target_row][0] = self.piece_location[col][row][0]
-        self.piece_location[col][row][0] = ""
-        return target_piece
-
-    def undo_move(self, original_position, move, target_piece):
-        col, row = chr(97 + original_position[0]), 8 - original_position[1]
-        target_col, target_row = chr(97 + move[0]), 8 - move[1]
-        self.piece_location[col][row][0] = self.piece_location[target_col][target_row][0]
-        self.piece_location[target_col][target_row][0] = target_piece
+        dst = square(*destination)
+        candidates = [move for move in self.moves if move_to(move) == dst]
+        if not candidates:
+            return
+        self.selected, self.moves = None, []
+        if promotion_piece(candidates[0]):
+            self.pending_promotion = candidates
+        else:
+            self.play_move(candidates[0])
+
+    def undo(self):
+        self.selected, self.moves = None, []
+        super().undo()
+
+    def redo(self):
+        self.selected, self.moves = None, []
+        super().redo()
+
+
+# Read/write view of the board in the old piece_location[file][rank] = [name, selected, [x, y]] layout.
+class PieceLocationView(Mapping):
+    def __init__(self, chess):
+        self.chess = chess
+
+    def __getitem__(self, file):
+        return _FileView(self.chess, FILES[file])
+
+    def __iter__(self):
+        return iter(FILES)
+
+    def __len__(self):
+        return 8
+
+
+class _FileView(Mapping):
+    def __init__(self, chess, file_index):
+        self.chess = chess
+        self.file_index = file_index
+
+    def __getitem__(self, rank):
+        if not 1 <= rank <= 8:
+            raise KeyError(rank)
+        return _SquareView(self.chess, (rank - 1) * 8 + self.file_index)
+
+    def __iter__(self):
+        return iter(range(1, 9))
+
+    def __len__(self):
+        return 8
+
+
+class _SquareView(Sequence):
+    def __init__(self, chess, sq):
+        self.chess = chess
+        self.sq = sq
+
+    def __getitem__(self, index):
+        return (PIECE_NAMES[self.chess.board.squares[self.sq]], self.chess.selected == self.sq, coords(self.sq))[index]
+
+    def __setitem__(self, index, value):
+        if index == 0:
+            self.chess.board.put(self.sq, PIECE_CODES[value])
+        elif index == 1:
+            if value:
+                self.chess.selected = self.sq
+            elif self.chess.selected == self.sq:
+                self.chess.selected = None
+        else:
+            raise IndexError(index)
+
+    def __len__(self):
+        return 3
@@ -0,0 +1,264 @@
+import threading
+import time
+
+from board import CAPTURE, PAWN, PROMOTION, move_name
+from evaluation import evaluate
+from movegen import legal_moves
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+INFINITY = 32000
+MATE = 31000
+# Scores beyond this are mates; they are stored relative to the node in the
+# transposition table and converted back to distance from the root on probe.
+MATE_BOUND = MATE - 1000
+# Bitbase wins score above any evaluation but below real mates. On top of
+# that, the winning side is steered to drive the lone king to the edge and
+# close in with its own king, so the search can see the mate.
+KNOWN_WIN = 20000
+CENTER_DISTANCE = tuple(max(3 - (sq & 7), (sq & 7) - 4) + max(3 - (sq >> 3), (sq >> 3) - 4) for sq in range(64))
+
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+PROMOTION_SCORE = 1 << 27
+KILLER_SCORES = (1 << 26, (1 << 26) - 1)
+MAX_SEARCH_PLY = 128
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Engine:
+    def __init__(self, time_limit=1.0, max_depth=64, table_mb=16, on_info=None, table=None, book=None,
+                 bitbases=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_mb) if table is None else table
+        self.on_info = on_info
+        self.book = book
+        self.bitbases = bitbases
+        self.root_in_ending = False
+        self.nodes = 0
+        self.start = 0.0
+        self.deadline = 0.0
+        self.stop_event = threading.Event()
+        self.pv = []
+        self.score = 0
+        self.depth = 0
+        self.killers = [[0, 0] for _ in range(MAX_SEARCH_PLY)]
+        self.history = [[0] * 64 for _ in range(16)]
+
+    def stop(self):
+        self.stop_event.set()
+
+    def ponderhit(self, time_limit=None):
+        # The predicted move was played: the pondering search becomes a
+        # normal one with a fresh budget from now.
+        self.start = time.perf_counter()
+        self.deadline = self.start + (self.time_limit if time_limit is None else time_limit)
+
+    def search(self, board, time_limit=None, stop_event=None, ponder=False):
+        board = board.copy()
+        root_ply = board.ply
+        started = self.start = time.perf_counter()
+        self.deadline = float("inf") if ponder else started + (self.time_limit if time_limit is None else time_limit)
+        self.stop_event = threading.Event() if stop_event is None else stop_event
+        self.nodes = 0
+        self.pv, self.score, self.depth = [], 0, 0
+        self.killers = [[0, 0] for _ in range(MAX_SEARCH_PLY)]
+        for row in self.history:
+            row[:] = [value >> 1 for value in row]
+        self.table.new_search()
+
+        if self.book is not None:
+            move = self.book.choose(board)
+            if move:
+                self.pv = [move]
+                return move
+
+        moves = legal_moves(board)
+        if not moves:
+            return 0
+        self.root_in_ending = len(board.piece_lists[0]) + len(board.piece_lists[1]) == 3
+        if len(moves) == 1:
+            self.pv = moves
+            return moves[0]
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, pv = self._root(board, moves, depth)
+            except SearchTimeout:
+                while board.ply > root_ply:
+                    board.unmake_move()
+                break
+            self.score, self.pv, self.depth = score, pv, depth
+            moves.remove(pv[0])
+            moves.insert(0, pv[0])
+            now = time.perf_counter()
+            if self.on_info:
+                elapsed = now - started
+                self.on_info({
+                    "depth": depth, "score": score, "nodes": self.nodes, "time": elapsed,
+                    "nps": int(self.nodes / elapsed) if elapsed else 0, "pv": " ".join(map(move_name, pv)),
+                    "hashfull": int(self.table.usage() * 1000),
+                })
+            # A new iteration costs several times the last one, so only
+            # start it while most of the budget is still left.
+            if abs(score) >= MATE_BOUND or now - self.start > (self.deadline - self.start) / 2:
+                break
+        return self.pv[0] if self.pv else moves[0]
+
+    def _root(self, board, moves, depth):
+        alpha, pv = -INFINITY, []
+        for move in moves:
+            board.make_move(move)
+            score, child_pv = self._negamax(board, depth - 1, -INFINITY, -alpha, 1)
+            board.unmake_move()
+            score = -score
+            if score > alpha or not pv:
+                alpha, pv = score, [move] + child_pv
+        self.table.store(board.key, depth, alpha, EXACT, pv[0])
+        return alpha, pv
+
+    def _check_time(self):
+        if self.stop_event.is_set() or time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_time()
+        if board.halfmove_clock >= 100 or board.repetition_count() > 1:
+            return 0, []
+        if ply >= MAX_SEARCH_PLY - 1:
+            return evaluate(board), []
+
+        in_check = board.is_in_check(board.turn)
+        if in_check:
+            depth += 1
+        if self.bitbases is not None and len(board.piece_lists[0]) + len(board.piece_lists[1]) == 3:
+            result = self.bitbases.probe(board)
+            # Lines that enter a known ending stop there. When the game is
+            # already in one, keep searching for the mate and only score the
+            # horizon from the bitbase.
+            if result is not None and (not result or depth <= 0 or not self.root_in_ending):
+                return (_known_win_score(board, result) if result else 0), []
+        if depth <= 0:
+            return self._quiescence(board, alpha, beta, ply), []
+
+        tt_move = 0
+        entry = self.table.probe(board.key)
+        if entry:
+            tt_depth, tt_score, bound, tt_move = entry
+            tt_score = _score_from_table(tt_score, ply)
+            if tt_depth >= depth and (bound == EXACT or bound == LOWER and tt_score >= beta
+                                      or bound == UPPER and tt_score <= alpha):
+                return tt_score, [tt_move] if tt_move else []
+
+        cached = self.table.probe_moves(board.key)
+        if cached is None:
+            moves = legal_moves(board)
+            self.table.store_moves(board.key, moves, in_check)
+        else:
+            moves = list(cached[0])
+        if not moves:
+            return (-MATE + ply if in_check else 0), []
+
+        original_alpha = alpha
+        best_score, best_move, best_pv = -INFINITY, 0, []
+        for move in self._ordered(board, moves, tt_move, ply):
+            board.make_move(move)
+            score, child_pv = self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            score = -score
+            if score > best_score:
+                best_score, best_move, best_pv = score, move, [move] + child_pv
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not move >> 12 & (CAPTURE | PROMOTION):
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[0], killers[1] = move, killers[0]
+                    self.history[board.squares[move & 63]][move >> 6 & 63] += depth * depth
+                break
+
+        bound = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        self.table.store(board.key, depth, _score_to_table(best_score, ply), bound, best_move)
+        return best_score, best_pv
+
+    def _quiescence(self, board, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_time()
+
+        in_check = board.is_in_check(board.turn)
+        if not in_check:
+            stand_pat = evaluate(board)
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+
+        moves = legal_moves(board)
+        if not moves:
+            return -MATE + ply if in_check else 0
+        if not in_check:
+            moves = [move for move in moves if move >> 12 & (CAPTURE | PROMOTION)]
+
+        for move in self._ordered(board, moves, 0, ply):
+            board.make_move(move)
+            score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _ordered(self, board, moves, tt_move, ply):
+        squares = board.squares
+        killers = self.killers[ply] if ply < MAX_SEARCH_PLY else (0, 0)
+        history = self.history
+
+        def order(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            flags = move >> 12
+            src, dst = move & 63, move >> 6 & 63
+            if flags & CAPTURE:
+                # MVV-LVA: the most valuable victim first, then the cheapest attacker.
+                victim = squares[dst] & 7 or PAWN
+                return CAPTURE_SCORE + victim * 8 - (squares[src] & 7)
+            if flags & PROMOTION:
+                return PROMOTION_SCORE + (flags & 3)
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+            return history[squares[src]][dst]
+
+        return sorted(moves, key=order, reverse=True)
+
+
+def _known_win_score(board, result):
+    # result is 1 when the side to move wins and -1 when it loses.
+    strong = board.turn if result > 0 else board.turn ^ 1
+    weak_king, strong_king = board.kings[strong ^ 1], board.kings[strong]
+    distance = abs((weak_king & 7) - (strong_king & 7)) + abs((weak_king >> 3) - (strong_king >> 3))
+    mop_up = 10 * CENTER_DISTANCE[weak_king] + 4 * (14 - distance)
+    return result * (KNOWN_WIN + mop_up) + evaluate(board)
+
+
+def _score_to_table(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
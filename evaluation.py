@@ -0,0 +1,177 @@
+from board import BLACK, KING, PAWN, WHITE
+from pst import EG, MAX_PHASE, MG, PHASES, pack, unpack
+
+# NumPy is only needed by the batch scorer, so it is imported on first use
+# rather than with the engine.
+np = None
+
+# Middlegame and endgame penalties per extra pawn on a file and per pawn
+# with no friendly pawn on a neighbouring file.
+DOUBLED = (10, 25)
+ISOLATED = (10, 15)
+# Passed pawn bonuses by rank counted from the pawn's own side.
+PASSED_MG = (0, 5, 10, 15, 25, 40, 60, 0)
+PASSED_EG = (0, 10, 20, 35, 60, 100, 150, 0)
+# Middlegame penalty for each file next to the king by how far in front of
+# it the nearest friendly pawn stands (no pawn counts as 0), and for a file
+# with no pawns at all.
+SHELTER = (25, 0, 10, 25, 25, 25, 25, 25)
+OPEN_FILE = 15
+
+# Pawn structure and king shelter depend only on where the pawns and kings
+# stand, which changes far less often than the rest of the position.
+PAWN_CACHE_SIZE = 1 << 16
+_pawn_cache = {}
+
+
+def evaluate(board):
+    # Tapered score from the side to move's point of view: the board's
+    # running piece-square total plus the cached pawn and king terms.
+    mg, eg = unpack(board.psqt + pawn_king_score(board))
+    phase = min(board.phase, MAX_PHASE)
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return -score if board.turn else score
+
+
+def pawn_king_score(board):
+    score = _pawn_cache.get(board.pawn_key)
+    if score is None:
+        if len(_pawn_cache) >= PAWN_CACHE_SIZE:
+            _pawn_cache.clear()
+        score = _pawn_cache[board.pawn_key] = _pawn_king_terms(board.squares, board.kings)
+    return score
+
+
+def _pawn_king_terms(squares, kings):
+    # Pawn ranks per file for each side, counted from that side's own edge.
+    files = ([[] for _ in range(8)], [[] for _ in range(8)])
+    for sq, piece in enumerate(squares):
+        if piece & 7 == PAWN:
+            color = piece >> 3
+            files[color][sq & 7].append(sq >> 3 if color == WHITE else 7 - (sq >> 3))
+
+    score = 0
+    for color in (WHITE, BLACK):
+        own, enemy = files[color], files[color ^ 1]
+        mg = eg = 0
+        for file, ranks in enumerate(own):
+            if not ranks:
+                continue
+            neighbours = [g for g in (file - 1, file + 1) if 0 <= g < 8]
+            if len(ranks) > 1:
+                mg -= DOUBLED[0] * (len(ranks) - 1)
+                eg -= DOUBLED[1] * (len(ranks) - 1)
+            if not any(own[g] for g in neighbours):
+                mg -= ISOLATED[0] * len(ranks)
+                eg -= ISOLATED[1] * len(ranks)
+            # Enemy ranks are flipped into this side's frame: a pawn is passed
+            # when none of them stand further up its own or a neighbouring file.
+            blockers = [7 - rank for g in neighbours + [file] for rank in enemy[g]]
+            for rank in ranks:
+                if all(blocker <= rank for blocker in blockers):
+                    mg += PASSED_MG[rank]
+                    eg += PASSED_EG[rank]
+
+        king = kings[color]
+        if king is not None:
+            king_file, king_rank = king & 7, king >> 3 if color == WHITE else 7 - (king >> 3)
+            for file in range(max(king_file - 1, 0), min(king_file + 2, 8)):
+                ahead = [rank for rank in own[file] if rank > king_rank]
+                mg -= SHELTER[min(ahead) - king_rank if ahead else 0]
+                if not own[file] and not enemy[file]:
+                    mg -= OPEN_FILE
+        score += pack(mg, eg) if color == WHITE else -pack(mg, eg)
+    return score
+
+
+def encode_positions(boards):
+    # One row of 64 piece codes per board, the layout evaluate_batch takes.
+    _import_numpy("encode_positions")
+    return np.frombuffer(b"".join(bytes(board.squares) for board in boards), dtype=np.uint8).reshape(-1, 64)
+
+
+def evaluate_batch(positions, turns=None):
+    # Score many positions at once for offline tuning: positions is an
+    # (n, 64) array of piece codes. Scores are from white's point of view,
+    # or from the side to move's when turns (0 white, 1 black) is given.
+    _import_numpy("evaluate_batch")
+    _build_arrays()
+    positions = np.asarray(positions, dtype=np.intp).reshape(-1, 64)
+    index = np.arange(64)
+    mg = _arrays["mg"][positions, index].sum(axis=1)
+    eg = _arrays["eg"][positions, index].sum(axis=1)
+    phase = np.minimum(_arrays["phase"][positions].sum(axis=1), MAX_PHASE)
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        color_mg, color_eg = _pawn_king_batch(positions, color)
+        mg += sign * color_mg
+        eg += sign * color_eg
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    if turns is not None:
+        score = np.where(np.asarray(turns) == BLACK, -score, score)
+    return score
+
+
+_arrays = {}
+
+
+def _import_numpy(caller):
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(f"{caller} needs numpy") from None
+        np = numpy
+
+
+def _build_arrays():
+    if not _arrays:
+        _arrays.update(
+            mg=np.array(MG, dtype=np.int64), eg=np.array(EG, dtype=np.int64),
+            phase=np.array(PHASES, dtype=np.int64), passed_mg=np.array(PASSED_MG, dtype=np.int64),
+            passed_eg=np.array(PASSED_EG, dtype=np.int64), shelter=np.array(SHELTER, dtype=np.int64),
+        )
+
+
+def _pawn_king_batch(positions, color):
+    # The same terms as _pawn_king_terms for one side, over all positions,
+    # with the board flipped for black so ranks count from that side's edge.
+    count = len(positions)
+    grid = positions.reshape(count, 8, 8)
+    if color == BLACK:
+        grid = grid[:, ::-1, :]
+    own = grid == PAWN | color << 3
+    enemy = grid == PAWN | (color ^ 1) << 3
+    ranks = np.arange(8)
+
+    pawns = own.sum(axis=1)
+    mg = -DOUBLED[0] * np.maximum(pawns - 1, 0).sum(axis=1)
+    eg = -DOUBLED[1] * np.maximum(pawns - 1, 0).sum(axis=1)
+    padded = np.pad(pawns, ((0, 0), (1, 1)))
+    isolated = (pawns * ((padded[:, :-2] + padded[:, 2:]) == 0)).sum(axis=1)
+    mg -= ISOLATED[0] * isolated
+    eg -= ISOLATED[1] * isolated
+
+    furthest = np.where(enemy, ranks[None, :, None], -1).max(axis=1)
+    padded = np.pad(furthest, ((0, 0), (1, 1)), constant_values=-1)
+    blockers = np.maximum(np.maximum(padded[:, :-2], padded[:, 2:]), furthest)
+    passed = own & (ranks[None, :, None] >= blockers[:, None, :])
+    mg += (passed * _arrays["passed_mg"][None, :, None]).sum(axis=(1, 2))
+    eg += (passed * _arrays["passed_eg"][None, :, None]).sum(axis=(1, 2))
+
+    kings = (grid == KING | color << 3).reshape(count, 64)
+    has_king = kings.any(axis=1)
+    king = kings.argmax(axis=1)
+    king_rank, king_file = king >> 3, king & 7
+    rows = np.arange(count)
+    for offset in (-1, 0, 1):
+        file = king_file + offset
+        valid = has_king & (file >= 0) & (file < 8)
+        file = np.clip(file, 0, 7)
+        column = own[rows, :, file]
+        ahead = column & (ranks[None, :] > king_rank[:, None])
+        nearest = np.where(ahead, ranks[None, :], 8).min(axis=1)
+        distance = np.where(ahead.any(axis=1), nearest - king_rank, 0)
+        open_file = ~column.any(axis=1) & ~enemy[rows, :, file].any(axis=1)
+        mg -= valid * (_arrays["shelter"][distance] + OPEN_FILE * open_file)
+    return mg, eg
@@ -1,65 +1,190 @@
 import os
+import time
 import pygame
 from pygame.locals import *
+import engine
+import game_state
+from bitboard import BitBoard
+from board import BLACK, Board
 from chess import Chess
-from utils import Utils
+from profiler import Profiler
+from utils import TextRenderer
+
+FPS = 60
+# Space above the board for the turn label and below it for the overlay.
+BOARD_TOP, STATUS_HEIGHT = 50, 60
+# Hot paths counted when profiling is on: move generation where the engine
+# (on its own thread) and the GUI call it, attack tests on both backends and
+# the GUI's per-frame work. Attack tests are counted at the method only, so
+# a query is not counted again inside square_attacked. possible_moves,
+# is_position_attacked and find_king are only kept as compatibility shims,
+# so they should stay at zero.
+INSTRUMENTED = (
+    (engine, ("legal_moves",)),
+    (game_state, ("legal_moves",)),
+    (Board, ("is_attacked",)),
+    (BitBoard, ("is_attacked",)),
+    (Chess, ("render", "square_at", "get_selected_square", "possible_moves", "is_position_attacked", "find_king")),
+)
+# The overlay text is refreshed a few times a second, not every frame.
+OVERLAY_INTERVAL = 0.5
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, profiler=None):
         pygame.display.init()
         pygame.font.init()
-        self.screen = pygame.display.set_mode([640, 750])
+        self.screen = pygame.display.set_mode([640, 750], RESIZABLE)
         pygame.display.set_caption("Chess")
         pygame.display.set_icon(pygame.image.load(os.path.join("res", "chess_icon.png")))
         self.clock, self.menu_showed, self.running = pygame.time.Clock(), False, True
+        self.text = TextRenderer()
+        # Static screens are drawn once when they appear; the board only
+        # pushes the rects that changed to the display.
+        self.shown_screen, self.redraw, self.dirty_rects = None, True, []
+        # A button fires once per press and release inside it; click holds
+        # the (press, release) positions seen this frame.
+        self.pressed, self.click = None, None
+        # F3 toggles the timing overlay in the strip under the board.
+        self.profiler = profiler or Profiler()
+        for owner, names in INSTRUMENTED:
+            self.profiler.instrument(owner, *names)
+        self.show_overlay, self.overlay_due = False, 0.0
 
     def start_game(self):
         self.setup_board()
+        profiler = self.profiler
         while self.running:
+            profiler.begin_frame()
             self.handle_events()
+            profiler.lap("input")
+            if self.menu_showed:
+                self.chess.play_turn()
+            screen = self.current_screen()
+            if screen != self.shown_screen:
+                self.shown_screen, self.redraw = screen, True
+            profiler.lap("logic")
             if not self.menu_showed:
                 self.menu()
             else:
                 self.display_game()
-            pygame.display.flip()
+            if self.show_overlay:
+                self.draw_overlay()
+            if self.redraw:
+                pygame.display.flip()
+            elif self.dirty_rects:
+                pygame.display.update(self.dirty_rects)
+            profiler.lap("render")
+            profiler.end_frame()
+            self.redraw, self.dirty_rects, self.click = False, [], None
             pygame.event.pump()
+            self.clock.tick(FPS)
+        self.chess.close()
         pygame.quit()
 
     def setup_board(self):
-        self.board_offset_x, self.board_offset_y = 0, 50
         self.board_img = pygame.image.load(os.path.join("res", "board.png")).convert()
-        square_len = self.board_img.get_rect().width // 8
+        square_len = self.layout()
+        # The computer plays from a Polyglot opening book when one is installed.
+        book = os.path.join("res", "book.bin")
+        self.chess = Chess(self.screen, os.path.join("res", "pieces.png"), self.board_locations, square_len,
+                           board_img=self.board_img, book=book if os.path.exists(book) else None)
+
+    def layout(self):
+        # Fit the board to the window between the turn label and the overlay
+        # strip; returns the square length.
+        width, height = self.screen.get_size()
+        square_len = max(min(width, height - BOARD_TOP - STATUS_HEIGHT) // 8, 8)
+        self.board_offset_x, self.board_offset_y = (width - square_len * 8) // 2, BOARD_TOP
         self.board_locations = [[
             [self.board_offset_x + (x * square_len), self.board_offset_y + (y * square_len)]
             for y in range(8)] for x in range(8)]
-        self.chess = Chess(self.screen, os.path.join("res", "pieces.png"), self.board_locations, square_len)
+        self.overlay_rect = pygame.Rect(0, BOARD_TOP + square_len * 8, width, height - BOARD_TOP - square_len * 8)
+        return square_len
+
+    def resize(self):
+        # The sprites and board layer are rescaled once here, then every
+        # screen is drawn again at the new size.
+        self.screen = self.chess.screen = pygame.display.get_surface()
+        square_len = self.layout()
+        self.chess.resize(self.board_locations, square_len)
+        self.redraw = True
+
+    def current_screen(self):
+        if not self.menu_showed:
+            return "menu"
+        if self.chess.winner:
+            return "winner"
+        if self.chess.pending_promotion:
+            return "promotion"
+        return "game"
 
     def handle_events(self):
         for event in pygame.event.get():
-            if event.type == pygame.QUIT or pygame.key.get_pressed()[K_ESCAPE]:
+            if event.type == pygame.QUIT or event.type == KEYDOWN and event.key == K_ESCAPE:
                 self.running = False
-            elif pygame.key.get_pressed()[K_SPACE]:
+            elif event.type == KEYDOWN and event.key == K_SPACE:
                 self.chess.reset()
+            elif event.type == KEYDOWN and event.key == K_LEFT:
+                self.chess.undo()
+            elif event.type == KEYDOWN and event.key == K_RIGHT:
+                self.chess.redo()
+            elif event.type == KEYDOWN and event.key == K_F3:
+                # Turning it off needs the screen under it back.
+                self.show_overlay, self.redraw, self.overlay_due = not self.show_overlay, True, 0.0
+            elif event.type == MOUSEBUTTONDOWN and event.button == 1:
+                self.pressed = event.pos
+                if self.shown_screen == "game":
+                    self.chess.click(event.pos)
+            elif event.type == MOUSEBUTTONUP and event.button == 1 and self.pressed:
+                self.click, self.pressed = (self.pressed, event.pos), None
+            elif event.type == VIDEORESIZE:
+                self.resize()
+            elif event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                self.redraw = True
 
     def menu(self):
-        self.screen.fill((255, 255, 255))
-        self.draw_text("Chess", 50, (0, 0, 0), self.screen.get_width() // 2, 150)
+        if self.redraw:
+            self.screen.fill((255, 255, 255))
+            self.draw_text("Chess", 50, (0, 0, 0), self.screen.get_width() // 2, 150)
         self.draw_button("Play", 270, 300, 100, 50, self.start_game_handler)
+        self.draw_button("Play vs computer", 220, 380, 200, 50, self.start_computer_game_handler)
 
     def display_game(self):
         if self.chess.winner:
             self.declare_winner(self.chess.winner)
+        elif self.chess.pending_promotion:
+            self.pawn_promotion()
         else:
-            self.screen.fill((0, 0, 0))
-            self.screen.blit(self.board_img, (self.board_offset_x, self.board_offset_y))
-            self.chess.play_turn()
-            self.chess.draw_pieces()
-            self.check_pawn_promotion()
+            if self.redraw:
+                self.screen.fill((0, 0, 0))
+                self.screen.blit(self.chess.board_layer, (self.board_offset_x, self.board_offset_y))
+            self.dirty_rects += self.chess.render(self.redraw)
+
+    def draw_overlay(self):
+        now = time.perf_counter()
+        if not self.redraw and now < self.overlay_due:
+            return
+        self.overlay_due = now + OVERLAY_INTERVAL
+        averages = self.profiler.averages()
+        info = self.chess.search_info
+        ms = {phase: averages.get(phase, 0) * 1000 for phase in ("frame", "input", "logic", "render")}
+        lines = [
+            f"FPS {self.clock.get_fps():.1f}  {ms['frame']:.2f} ms/frame  "
+            f"(input {ms['input']:.2f}  logic {ms['logic']:.2f}  render {ms['render']:.2f})",
+            f"calls/frame {averages.get('calls', 0):.1f}" + ("" if self.profiler.enabled else " (off)")
+            + f"  nodes/sec {info['nps'] if info else 0}",
+        ]
+        self.screen.fill((0, 0, 0), self.overlay_rect)
+        for index, line in enumerate(lines):
+            self.screen.blit(self.text.render(line, 16, (255, 255, 0)),
+                             (8, self.overlay_rect.y + 6 + index * 24))
+        self.dirty_rects.append(self.overlay_rect)
 
     def declare_winner(self, winner):
-        self.screen.fill((255, 255, 255))
-        self.draw_text(f"{winner} wins!", 50, (0, 0, 0), self.screen.get_width() // 2, 150)
+        if self.redraw:
+            self.screen.fill((255, 255, 255))
+            self.draw_text(f"{winner} wins!", 50, (0, 0, 0), self.screen.get_width() // 2, 150)
         self.draw_button("Play Again", 250, 300, 140, 50, self.reset_game_handler)
 
     def reset_game_handler(self):
@@ -69,40 +194,39 @@ class Game:
 
     def draw_button(self, label, x, y, w, h, callback):
         rect = pygame.Rect(x, y, w, h)
-        pygame.draw.rect(self.screen, (0, 0, 0), rect)
-        self.draw_text(label, 20, (255, 255, 255), x + w // 2, y + h // 2)
-        if Utils().left_click_event() and rect.collidepoint(*Utils().get_mouse_event()):
+        if self.redraw:
+            pygame.draw.rect(self.screen, (0, 0, 0), rect)
+            self.draw_text(label, 20, (255, 255, 255), x + w // 2, y + h // 2)
+        if self.click and rect.collidepoint(self.click[0]) and rect.collidepoint(self.click[1]):
+            # Consume the click so a button on the next screen cannot see it.
+            self.click = None
             pygame.draw.rect(self.screen, (255, 255, 255), rect, 3)
+            self.dirty_rects.append(rect)
             callback()
 
     def draw_text(self, text, size, color, x, y):
-        font = pygame.font.SysFont("comicsansms", size)
-        label = font.render(text, True, color)
+        label = self.text.render(text, size, color)
         self.screen.blit(label, (x - label.get_width() // 2, y - label.get_height() // 2))
 
     def start_game_handler(self):
         self.menu_showed = True
+        self.chess.play_against_computer(None)
+
+    def start_computer_game_handler(self):
+        self.menu_showed = True
+        self.chess.play_against_computer(BLACK)
 
-    def check_pawn_promotion(self):
-        for file, ranks in self.chess.piece_location.items():
-            for rank, piece_info in ranks.items():
-                piece_name, _, (x, y) = piece_info
-                if piece_name == "white_pawn" and y == 0:
-                    self.pawn_promotion(file, rank, "white")
-                elif piece_name == "black_pawn" and y == 7:
-                    self.pawn_promotion(file, rank, "black")
-
-    def pawn_promotion(self, file, rank, color):
-        self.screen.fill((200, 200, 200))
-        self.draw_text("Promote your pawn!", 30, (0, 0, 0), self.screen.get_width() // 2, 150)
+    def pawn_promotion(self):
+        if self.redraw:
+            self.screen.fill((200, 200, 200))
+            self.draw_text("Promote your pawn!", 30, (0, 0, 0), self.screen.get_width() // 2, 150)
         choices = ["queen", "rook", "bishop", "knight"]
         x_offset = 100
         for idx, choice in enumerate(choices):
             self.draw_button(
                 choice.capitalize(), x_offset + idx * 120, 300, 100, 50,
-                lambda ch=choice: self.promote_pawn(file, rank, f"{color}_{ch}")
+                lambda ch=choice: self.promote_pawn(ch)
             )
 
-    def promote_pawn(self, file, rank, new_piece):
-        self.chess.piece_location[file][rank][0] = new_piece
-        self.display_game()
+    def promote_pawn(self, choice):
+        self.chess.promote(choice)
@@ -0,0 +1,229 @@
+from bitbase import Bitbases
+from bitboard import BitBoard
+from book import OpeningBook
+from board import (
+    Board, BLACK, CAPTURE, COLOR_CODES, COLORS, DOUBLE_PUSH, EP_CAPTURE, KING, KING_CASTLE, KINDS, KNIGHT, PAWN,
+    PIECE_CODES, PIECE_NAMES, PROMOTION, QUEEN, QUEEN_CASTLE, QUIET, WHITE, coords, encode_move, move_flags,
+    move_from, move_to, promotion_piece, square, square_name,
+)
+from engine import Engine
+from movegen import is_checkmate, is_stalemate, legal_moves
+from pgn import export_pgn
+from transposition import TranspositionTable
+from worker import EngineWorker
+
+BACKENDS = {"array": Board, "bitboard": BitBoard}
+
+
+# Rules and game flow without any display: the board, move history, results
+# and the computer opponent. Chess draws and takes input on top of it.
+class GameState:
+    def __init__(self, backend="array", table_mb=16, verbose=False, book=None):
+        self.verbose = verbose
+        self.winner = ""
+        self.board = BACKENDS[backend]()
+        self.table = TranspositionTable(table_mb)
+        self.book = OpeningBook(book) if book else None
+        self.bitbases = Bitbases()
+        self.computer = None
+        self.engine = None
+        self.worker = None
+        self.search_info = None
+        self.reset()
+
+    def reset(self):
+        if self.worker:
+            self.worker.cancel()
+        self.pending_promotion = None
+        self.captured = []
+        self.redo_moves = []
+        self.board.reset()
+
+    @property
+    def turn(self):
+        return {"white": int(self.board.turn == WHITE), "black": int(self.board.turn == BLACK)}
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def possible_moves(self, piece_name, piece_coord):
+        if not piece_name:
+            return []
+        moves = self.board.piece_moves(square(*piece_coord), PIECE_CODES[piece_name])
+        return [coords(sq) for sq in moves]
+
+    def poll_computer(self):
+        # Start the engine on the computer's turn and play its move once the
+        # worker has one; returns the move played, if any.
+        if self.board.turn != self.computer or self.winner or self.pending_promotion:
+            return None
+        if not self.worker.busy:
+            self.worker.think(self.board)
+        move = self.worker.poll()
+        if move:
+            self.play_move(move)
+            pv = self.engine.pv
+            if not self.winner and len(pv) > 1 and pv[0] == move:
+                self.worker.ponder(self.board, pv[1])
+        return move
+
+    def promote(self, kind):
+        move = next(move for move in self.pending_promotion if KINDS[promotion_piece(move)] == kind)
+        self.pending_promotion = None
+        self.play_move(move)
+
+    def play_move(self, move):
+        src, dst = move_from(move), move_to(move)
+        piece_name = PIECE_NAMES[self.board.squares[src]]
+        mover = COLORS[self.board.turn].capitalize()
+        if self.worker and self.board.turn != self.computer:
+            self.worker.player_moved(move)
+        captured = self.board.make_move(move)
+        if captured:
+            self.captured.append(PIECE_NAMES[captured])
+        self.redo_moves = []
+        self.log(f"{piece_name} moved from {square_name(src)} to {square_name(dst)}")
+        self.check_result(mover)
+        outcome = self.endgame_outcome()
+        if outcome and not self.winner:
+            self.log(f"Endgame bitbase: {outcome}")
+
+    def endgame_outcome(self):
+        # Exact result with best play for small endings, or None.
+        result = self.bitbases.probe(self.board)
+        if result is None:
+            return None
+        if not result:
+            return "Draw"
+        return f"{COLORS[self.board.turn if result > 0 else self.board.turn ^ 1].capitalize()} wins"
+
+    def check_result(self, mover):
+        if self.is_checkmate():
+            self.log(f"Checkmate - {mover} wins!")
+            self.winner = mover
+        elif self.is_stalemate():
+            self.log("Stalemate - nobody wins!")
+            self.winner = "Nobody"
+        elif self.board.repetition_count() >= 3:
+            self.log("Threefold repetition - nobody wins!")
+            self.winner = "Nobody"
+
+    def load_fen(self, fen):
+        # Parse into a fresh board first so a bad FEN leaves the game as it was.
+        board = self.board.__class__()
+        board.set_fen(fen)
+        self.reset()
+        self.board = board
+        self.winner = ""
+        self.check_result(COLORS[board.turn ^ 1].capitalize())
+
+    def fen(self):
+        return self.board.fen()
+
+    def pgn(self, headers=None):
+        players = {color: "Computer" if COLOR_CODES[color] == self.computer else "Player" for color in COLORS}
+        tags = {"White": players["white"], "Black": players["black"]}
+        tags.update(headers or {})
+        result = None
+        if self.winner:
+            result = {"White": "1-0", "Black": "0-1"}.get(self.winner, "1/2-1/2")
+        return export_pgn(self.board, tags, result)
+
+    def undo(self):
+        if not self.board.ply:
+            return
+        if self.worker:
+            self.worker.cancel()
+        move = self.board.unmake_move()
+        if move_flags(move) & CAPTURE:
+            self.captured.pop()
+        self.redo_moves.append(move)
+        self.pending_promotion = None
+        self.winner = ""
+        # Take back the computer's reply together with the player's move.
+        if self.board.turn == self.computer:
+            self.undo()
+
+    def redo(self):
+        if not self.redo_moves:
+            return
+        if self.worker:
+            self.worker.cancel()
+        redo_moves = self.redo_moves
+        self.pending_promotion = None
+        self.play_move(redo_moves.pop())
+        self.redo_moves = redo_moves
+        if self.board.turn == self.computer and not self.winner:
+            self.redo()
+
+    def play_against_computer(self, color=BLACK, time_limit=1.0):
+        if self.worker:
+            self.worker.cancel()
+        self.computer = color
+        if color is not None and self.engine is None:
+            self.engine = Engine(time_limit, table=self.table, on_info=self._on_search_info, book=self.book,
+                                 bitbases=self.bitbases)
+            self.worker = EngineWorker(self.engine)
+        if self.engine:
+            self.engine.time_limit = time_limit
+
+    def close(self):
+        if self.worker:
+            self.worker.cancel()
+        if self.book:
+            self.book.close()
+        self.bitbases.close()
+
+    def _on_search_info(self, info):
+        self.search_info = info
+        self.log(f"depth {info['depth']} score {info['score']} nodes {info['nodes']} nps {info['nps']} "
+                 f"hashfull {info['hashfull']} pv {info['pv']}")
+
+    def legal_moves(self):
+        cached = self.table.probe_moves(self.board.key)
+        if cached is not None:
+            return list(cached[0])
+        moves = legal_moves(self.board)
+        self.table.store_moves(self.board.key, moves, self.board.is_in_check(self.board.turn))
+        return moves
+
+    def is_checkmate(self):
+        return is_checkmate(self.board)
+
+    def is_stalemate(self):
+        return is_stalemate(self.board)
+
+    def is_king_in_check(self, color):
+        return self.board.is_in_check(COLOR_CODES[color])
+
+    def is_king_in_checkmate(self, king_color):
+        return self.board.turn == COLOR_CODES[king_color] and is_checkmate(self.board)
+
+    def find_king(self, king_color):
+        sq = self.board.kings[COLOR_CODES[king_color]]
+        return None if sq is None else coords(sq)
+
+    def is_position_attacked(self, position, king_color):
+        return self.board.is_attacked(square(*position), COLOR_CODES[king_color] ^ 1)
+
+    def simulate_move(self, original_position, move):
+        # Flag the move the way the board plays it, so castling moves the
+        # rook, a double push sets en passant, en passant takes the pawn and
+        # a pawn reaching the last rank becomes a queen.
+        src, dst = square(*original_position), square(*move)
+        kind = self.board.squares[src] & 7
+        flags = CAPTURE if self.board.squares[dst] else QUIET
+        if kind == KING and abs(dst - src) == 2:
+            flags = KING_CASTLE if dst > src else QUEEN_CASTLE
+        elif kind == PAWN:
+            if abs(dst - src) == 16:
+                flags = DOUBLE_PUSH
+            elif dst == self.board.ep_square:
+                flags = EP_CAPTURE
+            elif dst >> 3 in (0, 7):
+                flags |= PROMOTION | QUEEN - KNIGHT
+        return PIECE_NAMES[self.board.make_move(encode_move(src, dst, flags))]
+
+    def undo_move(self, original_position, move, target_piece):
+        self.board.unmake_move()
@@ -1,5 +1,17 @@
+import argparse
+
 from game import Game
+from profiler import Profiler
 
 if __name__=="__main__":
-    game = Game()
-    game.start_game()
+    parser = argparse.ArgumentParser(description="Play chess. F3 shows the frame timing overlay.")
+    parser.add_argument("--profile", metavar="JSON", help="count hot-path calls and write the timings here on exit")
+    parser.add_argument("--cprofile", metavar="PROF", help="run under cProfile and write its stats here on exit")
+    args = parser.parse_args()
+    profiler = Profiler(enabled=bool(args.profile), cprofile=bool(args.cprofile))
+    game = Game(profiler)
+    profiler.start()
+    try:
+        game.start_game()
+    finally:
+        profiler.dump(args.profile, args.cprofile)
@@ -0,0 +1,279 @@
+from board import (
+    PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE,
+    EP_CAPTURE, PROMOTION, WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+    KNIGHT_TARGETS, KING_TARGETS, PAWN_ATTACKS, DIAGONAL_RAYS, LINEAR_RAYS, square_attacked,
+)
+from bitboard import (
+    ALL_SQUARES, BETWEEN, FILE_A, FILE_H, KING_ATTACKS, KNIGHT_ATTACKS, RANK_3, RANK_6, BitBoard, bishop_attacks,
+    rook_attacks, squares_of,
+)
+from bitboard import PAWN_ATTACKS as PAWN_ATTACK_MASKS
+
+CAPTURE_SHIFT = 12 + CAPTURE.bit_length() - 1
+PROMOTION_FLAGS = tuple(PROMOTION | kind - KNIGHT for kind in (QUEEN, ROOK, BISHOP, KNIGHT))
+
+
+def legal_moves(board):
+    return list(generate_legal_moves(board))
+
+
+def has_legal_move(board):
+    for _ in generate_legal_moves(board):
+        return True
+    return False
+
+
+def is_checkmate(board):
+    return board.is_in_check(board.turn) and not has_legal_move(board)
+
+
+def is_stalemate(board):
+    return not board.is_in_check(board.turn) and not has_legal_move(board)
+
+
+def check_info(squares, king, us):
+    # Walk out from the king once to find the checking pieces, the squares
+    # that resolve a single check, and each pinned piece with the squares it
+    # may still move to along its pin.
+    them = (us ^ 1) << 3
+    checkers, evasions, pins = [], None, {}
+    for t in PAWN_ATTACKS[us][king]:
+        if squares[t] == PAWN | them:
+            checkers.append(t)
+    for t in KNIGHT_TARGETS[king]:
+        if squares[t] == KNIGHT | them:
+            checkers.append(t)
+    if checkers:
+        evasions = set(checkers)
+
+    queen = QUEEN | them
+    for rays, slider in ((DIAGONAL_RAYS, BISHOP | them), (LINEAR_RAYS, ROOK | them)):
+        for ray in rays[king]:
+            pinned = None
+            for i, t in enumerate(ray):
+                piece = squares[t]
+                if not piece:
+                    continue
+                if piece == slider or piece == queen:
+                    if pinned is None:
+                        checkers.append(t)
+                        evasions = set(ray[:i + 1])
+                    else:
+                        pins[pinned] = set(ray[:i + 1])
+                elif piece >> 3 == us and pinned is None:
+                    pinned = t
+                    continue
+                break
+    return checkers, evasions, pins
+
+
+def generate_legal_moves(board):
+    if isinstance(board, BitBoard):
+        return _bitboard_moves(board)
+    return _array_moves(board)
+
+
+def _array_moves(board):
+    squares = board.squares
+    us = board.turn
+    them = us ^ 1
+    king = board.kings[us]
+    if king is None:
+        return
+    checkers, evasions, pins = check_info(squares, king, us)
+
+    # The king is lifted off the board while its targets are tested so that
+    # it cannot shield a square from the slider checking it.
+    king_moves = []
+    squares[king] = 0
+    for t in KING_TARGETS[king]:
+        target = squares[t]
+        if target and target >> 3 == us:
+            continue
+        if not square_attacked(squares, t, them):
+            king_moves.append(king | t << 6 | (CAPTURE if target else QUIET) << 12)
+    squares[king] = KING | us << 3
+    yield from king_moves
+
+    if len(checkers) > 1:
+        return
+
+    last_rank = 7 if us == WHITE else 0
+    for sq in list(board.piece_lists[us]):
+        piece = squares[sq]
+        if piece & 7 == KING:
+            continue
+        targets = board.piece_moves(sq)
+        pin = pins.get(sq)
+        for t in targets:
+            if evasions is not None and t not in evasions or pin is not None and t not in pin:
+                continue
+            flags = CAPTURE if squares[t] else QUIET
+            if piece & 7 == PAWN:
+                if t >> 3 == last_rank:
+                    for promotion in PROMOTION_FLAGS:
+                        yield sq | t << 6 | (promotion | flags) << 12
+                    continue
+                if t - sq == 16 or sq - t == 16:
+                    flags = DOUBLE_PUSH
+            yield sq | t << 6 | flags << 12
+
+    ep = board.ep_square
+    if ep is not None:
+        pawn = PAWN | us << 3
+        captured = ep - 8 if us == WHITE else ep + 8
+        for sq in PAWN_ATTACKS[them][ep]:
+            if squares[sq] != pawn:
+                continue
+            # En passant removes two pieces from one line, which pin
+            # detection cannot see, so test the resulting position directly.
+            captured_pawn = squares[captured]
+            squares[sq], squares[captured], squares[ep] = 0, 0, pawn
+            attacked = square_attacked(squares, king, them)
+            squares[sq], squares[captured], squares[ep] = pawn, captured_pawn, 0
+            if not attacked:
+                yield sq | ep << 6 | EP_CAPTURE << 12
+
+    if not checkers and board.castling:
+        rook = ROOK | us << 3
+        base = 0 if us == WHITE else 56
+        kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if us == WHITE else (BLACK_KINGSIDE, BLACK_QUEENSIDE)
+        if king == base + 4:
+            if (board.castling & kingside and squares[base + 7] == rook
+                    and not squares[base + 5] and not squares[base + 6]
+                    and not square_attacked(squares, base + 5, them)
+                    and not square_attacked(squares, base + 6, them)):
+                yield king | base + 6 << 6 | KING_CASTLE << 12
+            if (board.castling & queenside and squares[base] == rook
+                    and not squares[base + 1] and not squares[base + 2] and not squares[base + 3]
+                    and not square_attacked(squares, base + 3, them)
+                    and not square_attacked(squares, base + 2, them)):
+                yield king | base + 2 << 6 | QUEEN_CASTLE << 12
+
+
+
+def _bitboard_moves(board):
+    # The same moves as _array_moves, with checkers, evasions and pins kept
+    # as masks so targets are filtered with a couple of ANDs; pawns that are
+    # not pinned move all at once by shifting their bitboard.
+    bitboards = board.bitboards
+    us = board.turn
+    them = us ^ 1
+    king = board.kings[us]
+    if king is None:
+        return []
+    own, enemy = board.occupied[us], board.occupied[them]
+    occupied = own | enemy
+    base, our_base = them << 3, us << 3
+    diagonal = bitboards[BISHOP | base] | bitboards[QUEEN | base]
+    linear = bitboards[ROOK | base] | bitboards[QUEEN | base]
+    leapers = KNIGHT_ATTACKS[king] & bitboards[KNIGHT | base] | PAWN_ATTACK_MASKS[us][king] & bitboards[PAWN | base]
+    checkers = leapers | bishop_attacks(king, occupied) & diagonal | rook_attacks(king, occupied) & linear
+    moves = []
+
+    # King steps are tested with the king lifted off the occupancy so that
+    # it cannot shield a square from the slider checking it.
+    lifted = occupied ^ 1 << king
+    for t in squares_of(KING_ATTACKS[king] & ~own):
+        if not board.is_attacked(t, them, lifted):
+            moves.append(king | t << 6 | (CAPTURE if enemy >> t & 1 else QUIET) << 12)
+
+    if checkers & checkers - 1:
+        return moves
+    if checkers:
+        allowed = (checkers | BETWEEN[king][checkers.bit_length() - 1]) & ~own
+    else:
+        allowed = ALL_SQUARES & ~own
+
+    # An enemy slider that sees the king through exactly one of our pieces
+    # pins it to the line between them (capturing the slider included).
+    pins, pinned = {}, 0
+    for sniper in squares_of(bishop_attacks(king, enemy) & diagonal | rook_attacks(king, enemy) & linear):
+        blockers = BETWEEN[king][sniper] & occupied
+        if blockers and not blockers & blockers - 1 and blockers & own:
+            pins[blockers.bit_length() - 1] = BETWEEN[king][sniper] | 1 << sniper
+            pinned |= blockers
+
+    for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+        for sq in squares_of(bitboards[kind | our_base]):
+            if kind == KNIGHT:
+                targets = KNIGHT_ATTACKS[sq]
+            elif kind == BISHOP:
+                targets = bishop_attacks(sq, occupied)
+            elif kind == ROOK:
+                targets = rook_attacks(sq, occupied)
+            else:
+                targets = bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+            targets &= allowed
+            if pinned >> sq & 1:
+                targets &= pins[sq]
+            # Peel off the lowest bit; the capture flag is the target's
+            # enemy bit moved into place.
+            while targets:
+                low = targets & -targets
+                t = low.bit_length() - 1
+                moves.append(sq | t << 6 | (enemy >> t & 1) << CAPTURE_SHIFT)
+                targets ^= low
+
+    pawns = bitboards[PAWN | our_base]
+    free = pawns & ~pinned
+    empty = ~occupied
+    # Each set of targets with the square delta back to the pawn that moves.
+    if us == WHITE:
+        step, last_rank = 8, 7
+        single = free << 8 & empty
+        pushes = [(single & allowed, 8, QUIET), ((single & RANK_3) << 8 & empty & allowed, 16, DOUBLE_PUSH),
+                  ((free & ~FILE_A) << 7 & enemy & allowed, 7, CAPTURE),
+                  ((free & ~FILE_H) << 9 & enemy & allowed, 9, CAPTURE)]
+    else:
+        step, last_rank = -8, 0
+        single = free >> 8 & empty
+        pushes = [(single & allowed, -8, QUIET), ((single & RANK_6) >> 8 & empty & allowed, -16, DOUBLE_PUSH),
+                  ((free & ~FILE_H) >> 7 & enemy & allowed, -7, CAPTURE),
+                  ((free & ~FILE_A) >> 9 & enemy & allowed, -9, CAPTURE)]
+    for targets, delta, flags in pushes:
+        for t in squares_of(targets):
+            if t >> 3 == last_rank:
+                for promotion in PROMOTION_FLAGS:
+                    moves.append(t - delta | t << 6 | (promotion | flags) << 12)
+            else:
+                moves.append(t - delta | t << 6 | flags << 12)
+    for sq in squares_of(pawns & pinned):
+        targets = PAWN_ATTACK_MASKS[us][sq] & enemy
+        front = sq + step
+        if not occupied >> front & 1:
+            targets |= 1 << front
+            if sq >> 3 == (1 if us == WHITE else 6) and not occupied >> front + step & 1:
+                targets |= 1 << front + step
+        for t in squares_of(targets & allowed & pins[sq]):
+            flags = CAPTURE if enemy >> t & 1 else QUIET
+            if t >> 3 == last_rank:
+                for promotion in PROMOTION_FLAGS:
+                    moves.append(sq | t << 6 | (promotion | flags) << 12)
+            else:
+                moves.append(sq | t << 6 | (DOUBLE_PUSH if t - sq == 2 * step else flags) << 12)
+
+    ep = board.ep_square
+    if ep is not None:
+        captured = ep - step
+        for sq in squares_of(PAWN_ATTACK_MASKS[them][ep] & pawns):
+            # En passant clears two squares on one line, which the pin masks
+            # cannot see, so look at the king from the resulting occupancy.
+            after = occupied ^ (1 << sq | 1 << captured | 1 << ep)
+            if not (leapers & ~(1 << captured) or bishop_attacks(king, after) & diagonal
+                    or rook_attacks(king, after) & linear):
+                moves.append(sq | ep << 6 | EP_CAPTURE << 12)
+
+    if not checkers and board.castling:
+        rook = ROOK | our_base
+        squares = board.squares
+        base = 0 if us == WHITE else 56
+        kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if us == WHITE else (BLACK_KINGSIDE, BLACK_QUEENSIDE)
+        if king == base + 4:
+            if (board.castling & kingside and squares[base + 7] == rook and not occupied >> base + 5 & 3
+                    and not board.is_attacked(base + 5, them) and not board.is_attacked(base + 6, them)):
+                moves.append(king | base + 6 << 6 | KING_CASTLE << 12)
+            if (board.castling & queenside and squares[base] == rook and not occupied >> base + 1 & 7
+                    and not board.is_attacked(base + 3, them) and not board.is_attacked(base + 2, them)):
+                moves.append(king | base + 2 << 6 | QUEEN_CASTLE << 12)
+    return moves
@@ -0,0 +1,136 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+from board import START_FEN, move_name
+from game_state import BACKENDS
+from movegen import is_checkmate, legal_moves
+
+# Reference node counts from the Chess Programming Wiki perft results page,
+# with the depth the default suite runs each position to.
+POSITIONS = {
+    "start": (START_FEN, (20, 400, 8902, 197281, 4865609), 4),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 (48, 2039, 97862, 4085603), 3),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238, 674624), 4),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", (6, 264, 9467, 422333), 3),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", (44, 1486, 62379, 2103487), 3),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  (46, 2079, 89890, 3894594), 3),
+}
+
+
+def perft(board, depth):
+    if depth <= 0:
+        return 1
+    moves = legal_moves(board)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def divide(board, depth):
+    counts = {}
+    for move in legal_moves(board):
+        board.make_move(move)
+        counts[move_name(move)] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+
+def bench_queries(board, repeat=200):
+    # Per-call cost of the attack and checkmate queries the UI and search lean on.
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sq in range(64):
+            board.is_attacked(sq, 0)
+            board.is_attacked(sq, 1)
+    attacked = 128 * repeat / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        is_checkmate(board)
+    checkmate = repeat / (time.perf_counter() - start)
+    return {"is_attacked_per_second": int(attacked), "is_checkmate_per_second": int(checkmate)}
+
+
+def run_suite(names, backend, max_depth=None):
+    results = []
+    for name in names:
+        fen, expected, default_depth = POSITIONS[name]
+        depth = min(max_depth or default_depth, len(expected))
+        board = BACKENDS[backend]()
+        board.set_fen(fen)
+        start = time.perf_counter()
+        nodes = perft(board, depth)
+        elapsed = time.perf_counter() - start
+        result = {
+            "position": name, "depth": depth, "nodes": nodes, "expected": expected[depth - 1],
+            "ok": nodes == expected[depth - 1], "seconds": round(elapsed, 4),
+            "nps": int(nodes / elapsed) if elapsed else 0,
+        }
+        result.update(bench_queries(board))
+        results.append(result)
+        status = "ok" if result["ok"] else f"FAIL expected {result['expected']}"
+        print(f"{name:<10} depth {depth}  nodes {nodes:>9}  {status}  {elapsed:8.3f}s  {result['nps']:>8} nps")
+    return results
+
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = {(r["position"], r["depth"]): r for r in json.load(f)["results"]}
+    for result in results:
+        old = previous.get((result["position"], result["depth"]))
+        if old and old["nps"]:
+            change = result["nps"] / old["nps"] - 1
+            print(f"{result['position']:<10} {old['nps']:>8} -> {result['nps']:>8} nps ({change:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generator check and nodes-per-second benchmark.")
+    parser.add_argument("--fen", help="run a single position given as FEN instead of the suite")
+    parser.add_argument("--position", action="append", choices=sorted(POSITIONS), help="suite position(s) to run")
+    parser.add_argument("--depth", type=int, help="search depth (defaults per position)")
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="array")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="compare nodes/second with an earlier --json file")
+    args = parser.parse_args(argv)
+
+    if args.fen or args.divide:
+        fen = args.fen or POSITIONS[(args.position or ["start"])[0]][0]
+        board = BACKENDS[args.backend]()
+        board.set_fen(fen)
+        depth = args.depth or 1
+        start = time.perf_counter()
+        if args.divide:
+            counts = divide(board, depth)
+            for move, count in sorted(counts.items()):
+                print(f"{move}: {count}")
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(board, depth)
+        elapsed = time.perf_counter() - start
+        print(f"\nNodes: {nodes}  Time: {elapsed:.3f}s  NPS: {int(nodes / elapsed) if elapsed else 0}")
+        return 0
+
+    results = run_suite(args.position or list(POSITIONS), args.backend, args.depth)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "backend": args.backend,
+                "python": platform.python_version(), "results": results,
+            }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
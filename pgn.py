@@ -0,0 +1,245 @@
+import argparse
+import re
+import sys
+import time
+
+from board import (
+    CAPTURE, KING_CASTLE, PAWN, PROMOTION, QUEEN_CASTLE, START_FEN, WHITE, Board, parse_square,
+    promotion_piece, square_name,
+)
+from movegen import is_checkmate, is_stalemate, legal_moves
+
+PIECE_LETTERS = " PNBRQK"
+SAN_RE = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, NAGs, variation brackets, results, move numbers and moves; the
+# move alternative is last so "1-0" and "12." are not taken for moves.
+TOKEN_RE = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{}();$.]+")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAGS = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+# Movetext --check replays, with the position each game must reach; castling
+# is written with zeros, as some exporters do.
+CHECK_GAMES = (
+    ("1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. 0-0 Nf6 5. d3 0-0 *",
+     "r1bq1rk1/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQ1RK1 w - - 1 6"),
+    ("1. d4 d5 2. Nc3 Nc6 3. Bf4 Bf5 4. Qd2 Qd7 5. 0-0-0 0-0-0 *",
+     "2kr1bnr/pppqpppp/2n5/3p1b2/3P1B2/2N5/PPPQPPPP/2KR1BNR w - - 8 6"),
+)
+
+
+class PgnGame:
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    def replay(self, board=None):
+        # Yield each move as an encoded int while playing it on the board.
+        board = Board() if board is None else board
+        board.set_fen(self.headers.get("FEN", START_FEN))
+        for text in self.moves:
+            move = parse_san(board, text)
+            board.make_move(move)
+            yield move
+
+
+def san(board, move, moves=None):
+    moves = legal_moves(board) if moves is None else moves
+    src, dst, flags = move & 63, move >> 6 & 63, move >> 12
+    if flags == KING_CASTLE:
+        text = "O-O"
+    elif flags == QUEEN_CASTLE:
+        text = "O-O-O"
+    else:
+        kind = board.squares[src] & 7
+        capture = "x" if flags & CAPTURE else ""
+        if kind == PAWN:
+            text = (square_name(src)[0] if capture else "") + capture + square_name(dst)
+            if flags & PROMOTION:
+                text += "=" + PIECE_LETTERS[promotion_piece(move)]
+        else:
+            # Name the file, else the rank, else both, when another piece of
+            # the same kind can also reach the square.
+            rivals = [other & 63 for other in moves
+                      if other >> 6 & 63 == dst and other & 63 != src and board.squares[other & 63] & 7 == kind]
+            origin = ""
+            if rivals:
+                if all(sq & 7 != src & 7 for sq in rivals):
+                    origin = square_name(src)[0]
+                elif all(sq >> 3 != src >> 3 for sq in rivals):
+                    origin = square_name(src)[1]
+                else:
+                    origin = square_name(src)
+            text = PIECE_LETTERS[kind] + origin + capture + square_name(dst)
+
+    board.make_move(move)
+    if board.is_in_check(board.turn):
+        text += "#" if is_checkmate(board) else "+"
+    board.unmake_move()
+    return text
+
+
+def parse_san(board, text, moves=None):
+    moves = legal_moves(board) if moves is None else moves
+    text = text.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        flags = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+        matches = [move for move in moves if move >> 12 == flags]
+    else:
+        match = SAN_RE.match(text)
+        if not match:
+            raise ValueError(f"Invalid SAN: {text!r}")
+        piece, file, rank, target, promotion = match.groups()
+        kind = PIECE_LETTERS.index(piece) if piece else PAWN
+        dst = parse_square(target)
+        promoted = PIECE_LETTERS.index(promotion) if promotion else 0
+        matches = [
+            move for move in moves
+            if move >> 6 & 63 == dst and board.squares[move & 63] & 7 == kind
+            and (file is None or move & 7 == ord(file) - 97) and (rank is None or (move & 63) >> 3 == int(rank) - 1)
+            and promotion_piece(move) == promoted
+        ]
+    if len(matches) != 1:
+        raise ValueError(f"{'Ambiguous' if matches else 'Illegal'} move {text!r} in {board.fen()}")
+    return matches[0]
+
+
+def result(board):
+    if is_checkmate(board):
+        return "0-1" if board.turn == WHITE else "1-0"
+    if is_stalemate(board) or board.halfmove_clock >= 100 or board.repetition_count() >= 3:
+        return "1/2-1/2"
+    return "*"
+
+
+def export_pgn(board, headers=None, game_result=None):
+    # The board's own undo stack holds the game: unwind a copy to the start
+    # and replay it forwards to write each move in SAN.
+    start = board.copy()
+    moves = []
+    while start.ply:
+        moves.append(start.unmake_move())
+    moves.reverse()
+
+    game_result = game_result or result(board)
+    tags = {tag: "?" for tag in SEVEN_TAGS}
+    tags["Date"] = time.strftime("%Y.%m.%d")
+    tags.update(headers or {})
+    tags["Result"] = game_result
+    fen = start.fen()
+    if fen != START_FEN:
+        tags["SetUp"], tags["FEN"] = "1", fen
+
+    tokens = []
+    for ply, move in enumerate(moves):
+        if start.turn == WHITE:
+            tokens.append(f"{start.fullmove_number}.")
+        elif not ply:
+            tokens.append(f"{start.fullmove_number}...")
+        tokens.append(san(start, move))
+        start.make_move(move)
+    tokens.append(game_result)
+
+    lines, line = [], ""
+    for token in tokens:
+        if line and len(line) + len(token) >= 80:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    header_lines = [f'[{tag} "{value}"]' for tag, value in tags.items()]
+    return "\n".join(header_lines) + "\n\n" + "\n".join(lines) + "\n"
+
+
+def read_games(lines):
+    # Stream games one at a time from any iterable of text lines (an open
+    # file works), so memory stays bounded by the largest single game.
+    headers, movetext, in_comment = {}, [], False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("[") and not in_comment:
+            if movetext:
+                yield _parse_game(headers, movetext)
+                headers, movetext = {}, []
+            tag = TAG_RE.match(stripped)
+            if tag:
+                headers[tag.group(1)] = tag.group(2).replace('\\"', '"')
+        elif stripped and not stripped.startswith("%"):
+            movetext.append(line)
+            # Comments do not nest, so the last brace on a line tells whether
+            # one is still open at its end.
+            opened, closed = line.rfind("{"), line.rfind("}")
+            if opened != closed:
+                in_comment = opened > closed
+    if headers or movetext:
+        yield _parse_game(headers, movetext)
+
+
+def _parse_game(headers, movetext):
+    moves, depth, game_result = [], 0, headers.get("Result", "*")
+    for token in TOKEN_RE.findall("".join(movetext)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif token in RESULTS:
+            if not depth:
+                game_result = token
+        elif not depth and token[0] not in "{;$" and token[-1] != "." and not token.isdigit():
+            # Move numbers end in a dot; castling may still be written 0-0.
+            moves.append(token)
+    return PgnGame(headers, moves, game_result)
+
+
+def check():
+    failures = 0
+    for movetext, expected in CHECK_GAMES:
+        board = Board()
+        try:
+            for game in read_games([movetext]):
+                for _ in game.replay(board):
+                    pass
+            fen = board.fen()
+        except ValueError as error:
+            fen = str(error)
+        if fen != expected:
+            failures += 1
+            print(f"FAIL {movetext}\n  got      {fen}\n  expected {expected}")
+    print(f"{len(CHECK_GAMES) - failures}/{len(CHECK_GAMES)} games ok")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay every game of a PGN file through the move generator.")
+    parser.add_argument("path", nargs="?", help="PGN file to read")
+    parser.add_argument("--limit", type=int, help="stop after this many games")
+    parser.add_argument("--check", action="store_true", help="replay the built-in games and compare their positions")
+    args = parser.parse_args(argv)
+    if args.check:
+        return check()
+    if not args.path:
+        parser.error("a PGN file or --check is needed")
+
+    games = plies = errors = 0
+    board = Board()
+    start = time.perf_counter()
+    with open(args.path, encoding="utf-8", errors="replace") as f:
+        for game in read_games(f):
+            games += 1
+            try:
+                for _ in game.replay(board):
+                    plies += 1
+            except ValueError as error:
+                errors += 1
+                print(f"game {games}: {error}", file=sys.stderr)
+            if games == args.limit:
+                break
+    elapsed = time.perf_counter() - start
+    print(f"Games: {games}  Plies: {plies}  Errors: {errors}  Time: {elapsed:.3f}s  "
+          f"Plies/s: {int(plies / elapsed) if elapsed else 0}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
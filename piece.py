@@ -1,23 +1,14 @@
-import os
 import pygame
 
+from board import BISHOP, COLORS, KING, KNIGHT, PAWN, PIECE_CODES, QUEEN, ROOK
+
+# Spritesheet column of each piece kind; white is the first row, black the second.
+SHEET_COLUMNS = {KING: 0, QUEEN: 1, BISHOP: 2, KNIGHT: 3, ROOK: 4, PAWN: 5}
+
+
 class Piece(pygame.sprite.Sprite):
-    def __init__(self, filename, cols, rows):
+    def __init__(self, filename, cols, rows, square_length=None):
         pygame.sprite.Sprite.__init__(self)
-        self.pieces = {
-            "white_pawn":   5,
-            "white_knight": 3,
-            "white_bishop": 2,
-            "white_rook":   4,
-            "white_king":   0,
-            "white_queen":  1,
-            "black_pawn":   11,
-            "black_knight": 9,
-            "black_bishop": 8,
-            "black_rook":   10,
-            "black_king":   6,
-            "black_queen":  7
-        }
         self.spritesheet = pygame.image.load(filename).convert_alpha()
 
         self.cols = cols
@@ -29,8 +20,23 @@ class Piece(pygame.sprite.Sprite):
         h = self.cell_height = self.rect.height // self.rows
 
         self.cells = list([(i % cols * w, i // cols * h, w, h) for i in range(self.cell_count)])
+        # One ready-to-blit surface per integer piece code, sized to a square.
+        self.sprites = [None] * 16
+        self.square_length = None
+        self.resize(square_length or w)
 
-    def draw(self, surface, piece_name, coords):
-        piece_index = self.pieces[piece_name]
-        surface.blit(self.spritesheet, coords, self.cells[piece_index])
+    def resize(self, square_length):
+        if square_length == self.square_length:
+            return
+        self.square_length = square_length
+        for color in range(len(COLORS)):
+            for kind, column in SHEET_COLUMNS.items():
+                sprite = self.spritesheet.subsurface(self.cells[color * self.cols + column])
+                if sprite.get_size() != (square_length, square_length):
+                    sprite = pygame.transform.smoothscale(sprite, (square_length, square_length))
+                self.sprites[kind | color << 3] = sprite.convert_alpha()
 
+    def draw(self, surface, piece, coords):
+        if isinstance(piece, str):
+            piece = PIECE_CODES[piece]
+        surface.blit(self.sprites[piece], coords)
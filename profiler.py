@@ -0,0 +1,105 @@
+import cProfile
+import json
+import time
+from collections import deque
+from types import ModuleType
+
+# Frames kept for the rolling averages the overlay shows.
+WINDOW = 120
+
+
+class Profiler:
+    def __init__(self, enabled=False, cprofile=False):
+        # Frame phase timings are always kept (a few clock reads per frame);
+        # call counters are only wired in, and only cost anything, when enabled.
+        self.enabled = enabled
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self.calls, self.times = {}, {}
+        # Running call total; each frame takes what was added since the last,
+        # including calls made on other threads while the loop slept.
+        self.call_count = self.counted = 0
+        self.frames = deque(maxlen=WINDOW)
+        self.frame, self.mark = {}, time.perf_counter()
+        self.frame_count = 0
+        self.totals, self.peaks = {}, {}
+
+    def instrument(self, owner, *names):
+        # Replace the named functions of a module, or methods of a class or
+        # instance, with counting, timing wrappers. Only owner is changed:
+        # a module that imported a function by name keeps its own reference.
+        if not self.enabled:
+            return
+        label = owner.__name__ if isinstance(owner, (type, ModuleType)) else type(owner).__name__
+        for name in names:
+            setattr(owner, name, self._wrap(f"{label}.{name}", getattr(owner, name)))
+
+    def _wrap(self, name, method):
+        calls, times = self.calls, self.times
+        calls[name], times[name] = 0, 0.0
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[name] += clock() - start
+                calls[name] += 1
+                self.call_count += 1
+        return wrapper
+
+    def start(self):
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def begin_frame(self):
+        self.frame = {}
+        self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        # Time since the last mark goes to this phase of the current frame.
+        now = time.perf_counter()
+        self.frame[phase] = self.frame.get(phase, 0.0) + now - self.mark
+        self.mark = now
+
+    def end_frame(self):
+        frame = self.frame
+        frame["frame"] = sum(frame.values())
+        frame["calls"], self.counted = self.call_count - self.counted, self.call_count
+        self.frames.append(frame)
+        self.frame_count += 1
+        for key, value in frame.items():
+            self.totals[key] = self.totals.get(key, 0) + value
+            self.peaks[key] = max(self.peaks.get(key, 0), value)
+
+    def averages(self):
+        # Mean of each frame value over the last WINDOW frames.
+        if not self.frames:
+            return {}
+        keys = {key for frame in self.frames for key in frame}
+        return {key: sum(frame.get(key, 0) for frame in self.frames) / len(self.frames) for key in keys}
+
+    def report(self):
+        frames = self.frame_count or 1
+        return {
+            "frames": self.frame_count,
+            "phases_ms": {
+                key: {"mean": round(value * 1000 / frames, 3), "max": round(self.peaks[key] * 1000, 3)}
+                for key, value in self.totals.items() if key != "calls"
+            },
+            "calls_per_frame": round(self.totals.get("calls", 0) / frames, 3),
+            "calls": {
+                name: {"count": count, "total_ms": round(self.times[name] * 1000, 3),
+                       "mean_us": round(self.times[name] * 1e6 / count, 3) if count else 0}
+                for name, count in self.calls.items()
+            },
+        }
+
+    def dump(self, path=None, cprofile_path=None):
+        if self.cprofile:
+            self.cprofile.disable()
+            if cprofile_path:
+                self.cprofile.dump_stats(cprofile_path)
+        if path:
+            with open(path, "w") as f:
+                json.dump(self.report(), f, indent=2)
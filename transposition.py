@@ -0,0 +1,72 @@
+from array import array
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+# Search entries are a key word and a data word holding the best move in
+# bits 0-15, the score (offset by 2**15) in 16-31, the depth in 32-39, the
+# bound type in 40-41 and the search age from bit 42 up.
+ENTRY_BYTES = 16
+# Move list entries are (key, array('H') of moves, in-check flag) tuples,
+# stored in a single slot so a reader on another thread never pairs one
+# position's key with another's moves; 128 bytes covers tuple and array.
+MOVE_ENTRY_BYTES = 128
+SCORE_OFFSET = 1 << 15
+
+
+def _slots(budget, entry_bytes):
+    # Largest power of two that fits, so a key maps to a slot with a mask.
+    count = max(budget // entry_bytes, 1)
+    return 1 << count.bit_length() - 1
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        budget = int(size_mb * 1024 * 1024)
+        self.size = _slots(budget * 3 // 4, ENTRY_BYTES)
+        self.move_size = _slots(budget // 4, MOVE_ENTRY_BYTES)
+        self.age = 0
+        self.clear()
+
+    def clear(self):
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.move_lists = [None] * self.move_size
+        self.age = 0
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0x3FFFFF
+
+    def store(self, key, depth, score, bound, move=0):
+        index = key & self.size - 1
+        old = self.data[index]
+        # Keep a deeper entry for another position from the current search;
+        # anything stale, shallower or for the same position is replaced.
+        if (old and self.keys[index] != key and old >> 42 == self.age
+                and old >> 32 & 0xFF > depth):
+            return
+        if not move and self.keys[index] == key:
+            move = old & 0xFFFF
+        self.keys[index] = key
+        self.data[index] = (move | score + SCORE_OFFSET << 16 | min(max(depth, 0), 255) << 32 | bound << 40
+                            | self.age << 42)
+
+    def probe(self, key):
+        index = key & self.size - 1
+        data = self.data[index]
+        if not data or self.keys[index] != key:
+            return None
+        return data >> 32 & 0xFF, (data >> 16 & 0xFFFF) - SCORE_OFFSET, data >> 40 & 3, data & 0xFFFF
+
+    def store_moves(self, key, moves, in_check):
+        self.move_lists[key & self.move_size - 1] = (key, array("H", moves), in_check)
+
+    def probe_moves(self, key):
+        entry = self.move_lists[key & self.move_size - 1]
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1], entry[2]
+
+    def usage(self):
+        # Share of a sample of slots written by the current search.
+        sample = min(self.size, 1000)
+        return sum(1 for i in range(sample) if self.data[i] >> 42 == self.age and self.data[i]) / sample
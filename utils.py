@@ -1,14 +1,22 @@
 import pygame
 
-class Utils:
-    @staticmethod
-    def get_mouse_event():
-        return pygame.mouse.get_pos()
+class TextRenderer:
+    # SysFont is a system font lookup and render allocates a new surface, so
+    # both are done once per size and label instead of every frame.
+    def __init__(self, name="comicsansms"):
+        self.name = name
+        self.fonts = {}
+        self.labels = {}
 
-    @staticmethod
-    def left_click_event():
-        mouse_btn = pygame.mouse.get_pressed()
-        left_click = False
-        if mouse_btn[0]:
-            left_click = True
-        return left_click
\ No newline at end of file
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.SysFont(self.name, size)
+        return font
+
+    def render(self, text, size, color):
+        key = text, size, color
+        label = self.labels.get(key)
+        if label is None:
+            label = self.labels[key] = self.font(size).render(text, True, color)
+        return label
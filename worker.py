@@ -0,0 +1,67 @@
+import threading
+
+
+class EngineWorker:
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = None
+        self.stop_event = None
+        self.result = None
+        self.ponder_move = None
+        self.ponder_hit = False
+
+    @property
+    def busy(self):
+        return self.thread is not None
+
+    @property
+    def pondering(self):
+        return self.ponder_move is not None and not self.ponder_hit
+
+    def think(self, board, time_limit=None):
+        self.cancel()
+        self._start(board.copy(), time_limit, False)
+
+    def ponder(self, board, move):
+        # Search the position after the reply the engine expects, on the
+        # player's time; player_moved turns it into the real search on a hit.
+        self.cancel()
+        snapshot = board.copy()
+        snapshot.make_move(move)
+        self.ponder_move = move
+        self._start(snapshot, None, True)
+
+    def player_moved(self, move):
+        if self.ponder_move is None:
+            return
+        if move == self.ponder_move and self.thread is not None:
+            self.ponder_hit = True
+            self.engine.ponderhit()
+        else:
+            self.cancel()
+
+    def poll(self):
+        if self.thread is None or self.thread.is_alive() or self.pondering:
+            return None
+        self.thread.join()
+        move, self.result = self.result, None
+        self.thread, self.stop_event, self.ponder_move, self.ponder_hit = None, None, None, False
+        return move
+
+    def cancel(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+        self.thread, self.stop_event, self.result = None, None, None
+        self.ponder_move, self.ponder_hit = None, False
+
+    def _start(self, snapshot, time_limit, ponder):
+        stop_event = self.stop_event = threading.Event()
+
+        def run():
+            move = self.engine.search(snapshot, time_limit, stop_event, ponder)
+            if not stop_event.is_set():
+                self.result = move
+
+        self.thread = threading.Thread(target=run, name="engine", daemon=True)
+        self.thread.start()